@@ -0,0 +1,94 @@
+'''Tamaño del spec de Vega-Lite de los boxplots antes y después de calcular las cajas en el servidor.
+
+Uso (desde la raiz del repositorio):
+    python -m benchmarks.bench_boxplot_payload
+    BENCH_DAYS=730 python -m benchmarks.bench_boxplot_payload
+
+Antes, mark_boxplot recibía todas las filas horarias del medidor y el navegador calculaba los
+cuartiles; ahora el chart lleva una fila por caja (24 horas o 7 días) y los puntos atípicos. Se mide
+el JSON que Streamlit envía por el websocket y el tiempo de armarlo. El tiempo de render en el
+navegador no se puede medir aquí (no hay navegador); se espera que baje con el número de filas que
+Vega tiene que agregar.'''
+import datetime
+import os
+import time
+import types
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from utils.cube import build_cube
+from utils.plots.Boxplot_Costo_Horario import plot_hourly_boxplot_cost_altair
+from utils.plots.Boxplot_Diario import plot_daily_boxplot_altair
+from utils.plots.Boxplot_Horario import plot_hourly_boxplot_altair
+from utils.plots.Carga_Base import base_load
+from utils.store import MeterStore
+
+DAYS = int(os.getenv('BENCH_DAYS', 365))
+COLUMN = 'medidor'
+
+
+def raw_boxplot(data, x, y, size=23):
+    # the charts as they were: every row goes into the spec
+    return alt.Chart(data).mark_boxplot(size=size, box={'stroke': 'black'}, median=alt.MarkConfig(stroke='red')).encode(
+        x=x, y=alt.Y(f'{y}:Q').scale(zero=False))
+
+
+def previous_charts(data):
+    hourly = data.copy()
+    hourly['fecha'] = hourly['fecha'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    daily = data.set_index('fecha').resample('D').sum().reset_index()
+    daily['DayOfWeek'] = daily['fecha'].dt.dayofweek
+    daily['fecha'] = daily['fecha'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return {
+        'Boxplot_Horario': lambda: raw_boxplot(hourly, alt.X('hours(fecha):N'), COLUMN),
+        'Boxplot_Costo_Horario': lambda: raw_boxplot(hourly, alt.X('hours(fecha):N'), COLUMN),
+        'Carga_Base': lambda: raw_boxplot(hourly, alt.X('hours(fecha):N'), COLUMN),
+        'Boxplot_Diario': lambda: raw_boxplot(daily, alt.X('DayOfWeek:N'), COLUMN, size=55),
+    }
+
+
+def current_charts(store, session_state):
+    data = store.frame(COLUMN)
+    return {
+        'Boxplot_Horario': lambda: plot_hourly_boxplot_altair(build_cube(store), COLUMN, session_state),
+        'Boxplot_Costo_Horario': lambda: plot_hourly_boxplot_cost_altair(build_cube(store), COLUMN, session_state),
+        'Carga_Base': lambda: base_load(data, COLUMN, session_state),
+        'Boxplot_Diario': lambda: plot_daily_boxplot_altair(data, COLUMN, session_state),
+    }
+
+
+def measure(build, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = build().to_json()
+        best = min(best, time.perf_counter() - start)
+    return len(payload.encode()), best
+
+
+def main():
+    # st.altair_chart lifts the 5000 rows limit, the previous charts relied on that
+    alt.data_transformers.disable_max_rows()
+    rng = np.random.default_rng(0)
+    fecha = pd.date_range('2023-01-01', periods=DAYS * 24, freq='h')
+    long_df = pd.DataFrame({'fecha': fecha, 'meter_id': 0, 'value': rng.gamma(2.0, 10.0, len(fecha))})
+    store = MeterStore.from_long(long_df, pd.DataFrame({'meter_id': [0], 'meter_name': [COLUMN]})).freeze()
+    session_state = types.SimpleNamespace(zero_values=True, cost=650.0, days=[],
+                                          min_date=datetime.date(2023, 1, 1), max_date=fecha[-1].date())
+
+    previous = previous_charts(store.frame(COLUMN))
+    current = current_charts(store, session_state)
+    print(f'{len(fecha):,} lecturas horarias de un medidor')
+    print(f'{"chart":<22} {"antes":>12} {"ahora":>12} {"armado antes":>14} {"armado ahora":>14}')
+    for name in previous:
+        size_before, time_before = measure(previous[name])
+        size_after, time_after = measure(current[name])
+        print(f'{name:<22} {size_before / 1024:9.1f} KB {size_after / 1024:9.1f} KB '
+              f'{time_before * 1e3:11.1f} ms {time_after * 1e3:11.1f} ms')
+    print('render en el navegador: no medido en este entorno')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+'''Tiempo y memoria pico de combinacion_consultas sobre un resultado sintetico de get_organization_data.
+
+Uso (desde la raiz del repositorio):
+    python -m benchmarks.bench_combinacion_consultas
+    BENCH_ROWS=5000000 python -m benchmarks.bench_combinacion_consultas
+
+Compara la version anterior (conversiones str -> float -> int -> str, apply fila a fila y fillna
+sobre todo el DF) con la actual. La memoria pico se mide con tracemalloc, que incluye los
+arreglos de numpy.'''
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from utils.ETL import T_MEDIDORES_COLUMNS, combinacion_consultas
+
+ROWS = int(os.getenv('BENCH_ROWS', 3_000_000))
+METERS = 400
+
+
+def combinacion_consultas_anterior(organization_data, t_medidores):
+    consulta_combinada = pd.merge(left=organization_data, right=t_medidores, left_on='id_medidor',
+                                  right_on='ID Medidor', how='inner')
+    consulta_combinada = consulta_combinada[['id_medidor', 'variable', 'valor', 'fecha',
+                                             'Nombre DU', 'Jerarquía', 'Nombre Inmueble', 'Sistema Equipo',
+                                             'ID Inmueble', 'Nombre Cliente', 'Estado medidor']]
+    consulta_combinada['Jerarquía'] = consulta_combinada['Jerarquía'].astype(str)
+    consulta_combinada = consulta_combinada[consulta_combinada['Jerarquía'] != 'nan']
+    consulta_combinada['Jerarquía'] = consulta_combinada['Jerarquía'].astype(float)
+    consulta_combinada['Jerarquía'] = consulta_combinada['Jerarquía'].astype(int)
+    consulta_combinada['Jerarquía'] = consulta_combinada['Jerarquía'].astype(str)
+    consulta_combinada['ID Inmueble'] = consulta_combinada['ID Inmueble'].astype(str)
+    consulta_combinada = consulta_combinada[consulta_combinada['ID Inmueble'] != 'nan']
+    consulta_combinada = consulta_combinada[consulta_combinada['ID Inmueble'].apply(lambda x: x.isnumeric())]
+    consulta_combinada['ID Inmueble'] = consulta_combinada['ID Inmueble'].astype(float)
+    consulta_combinada['ID Inmueble'] = consulta_combinada['ID Inmueble'].astype(int)
+    consulta_combinada['ID Inmueble'] = consulta_combinada['ID Inmueble'].astype(str)
+    consulta_combinada = consulta_combinada[consulta_combinada['Estado medidor'] == 'Activo']
+    consulta_combinada = consulta_combinada.fillna(0)
+    consulta_combinada['dia'] = consulta_combinada['fecha'].dt.dayofweek
+    return consulta_combinada
+
+
+def synthetic_inputs(rows=ROWS, meters=METERS, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.array([f'meter-{i:05d}' for i in range(meters)], dtype=object)
+
+    t_medidores = pd.DataFrame({column: None for column in T_MEDIDORES_COLUMNS}, index=range(meters))
+    t_medidores['ID Medidor'] = ids
+    t_medidores['Nombre Medidor'] = [f'Medidor {i}' for i in range(meters)]
+    t_medidores['Sistema Equipo'] = rng.choice(['Aire', 'Iluminación', 'Bombeo'], meters)
+    t_medidores['ID Inmueble'] = rng.choice(['101', '102', '103', 'N/A', None], meters)
+    t_medidores['Nombre Inmueble'] = t_medidores['ID Inmueble'].map(lambda x: f'Inmueble {x}')
+    t_medidores['ID Cliente'] = 1
+    t_medidores['Nombre Cliente'] = 'Cliente'
+    t_medidores['Jerarquía'] = rng.choice([1.0, 2.0, 3.0, np.nan], meters)
+    t_medidores['Estado medidor'] = rng.choice(['Activo', 'Inactivo'], meters, p=[0.9, 0.1])
+    t_medidores['Nombre DU'] = rng.choice(['DU 1', 'DU 2', None], meters)
+
+    organization_data = pd.DataFrame({
+        'organization_id': 1,
+        'id_medidor': ids[rng.integers(0, meters, rows)],
+        'nombre del medidor': 'x',
+        'variable': 'act_ene',
+        'valor': np.where(rng.random(rows) < 0.01, np.nan, rng.gamma(2.0, 10.0, rows)),
+        'fecha': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 24 * 120, rows), unit='h'),
+    })
+    return organization_data, t_medidores
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+if __name__ == '__main__':
+    organization_data, t_medidores = synthetic_inputs()
+    print(f'{len(organization_data):,} filas, {len(t_medidores)} medidores')
+    print(f"{'version':>10} {'tiempo [s]':>11} {'pico [MB]':>10} {'resultado [MB]':>15} {'filas':>10}")
+    for name, func in [('anterior', combinacion_consultas_anterior), ('actual', combinacion_consultas)]:
+        seconds, peak, result = measure(func, organization_data, t_medidores)
+        size = result.memory_usage(deep=True).sum()
+        print(f'{name:>10} {seconds:>11.2f} {peak / 2**20:>10.0f} {size / 2**20:>15.0f} {len(result):>10,}')
+        del result
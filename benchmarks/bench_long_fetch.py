@@ -0,0 +1,89 @@
+'''Latencia del pivot por medidor: SUM(CASE ...) en Postgres vs. flujo largo pivotado en el cliente.
+
+Uso (desde la raiz del repositorio):
+    python -m benchmarks.bench_long_fetch
+    BENCH_ORGANIZATION_ID=123 python -m benchmarks.bench_long_fetch   # incluye la consulta real
+
+Sin BENCH_ORGANIZATION_ID solo se mide el tamaño del SQL y el pivot en el cliente sobre datos
+sinteticos de un año horario. Con la variable definida se toman los primeros N medidores de la
+organización y se mide get_data de punta a punta en ambos modos.'''
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.ETL import build_case_query, build_long_query, get_connection, get_data, pivot_long_data
+
+METER_COUNTS = [10, 100, 500]
+HOURS = 24 * 365
+
+
+def synthetic_meters(n):
+    ids = [f'meter-{i:05d}' for i in range(n)]
+    return pd.DataFrame({'meter_id': ids, 'meter_name': [f'Medidor {i}' for i in range(n)]})
+
+
+def synthetic_long(meters, hours=HOURS, missing=0.2, seed=0):
+    rng = np.random.default_rng(seed)
+    fechas = pd.date_range('2023-01-01', periods=hours, freq='h')
+    fecha = np.repeat(fechas.to_numpy(), len(meters))
+    meter_id = np.tile(meters['meter_id'].to_numpy(), hours)
+    keep = rng.random(len(fecha)) > missing
+    return pd.DataFrame({'fecha': fecha[keep], 'meter_id': meter_id[keep],
+                         'value': rng.gamma(2.0, 10.0, keep.sum())})
+
+
+def timed(func, *args, repeat=3, **kwargs):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_synthetic():
+    print(f"{'medidores':>10} {'sql case [KB]':>14} {'sql long [KB]':>14} {'filas':>10} {'pivot [s]':>10}")
+    for n in METER_COUNTS:
+        meters = synthetic_meters(n)
+        case_sql = build_case_query(meters, 1, '2023-01-01', '2024-01-01', 'act_pwr')
+        long_sql = build_long_query(meters, 1, '2023-01-01', '2024-01-01', 'act_pwr')
+        long_df = synthetic_long(meters)
+        seconds = timed(pivot_long_data, long_df, meters)
+        print(f'{n:>10} {len(case_sql) / 1024:>14.1f} {len(long_sql) / 1024:>14.1f} {len(long_df):>10} {seconds:>10.3f}')
+
+
+def bench_database(organization_id):
+    with get_connection() as conn:
+        meters = pd.read_sql(f"""
+        SELECT m.id AS meter_id, m.name AS meter_name
+        FROM usage_management.meters m
+        WHERE m.organization_id = {organization_id}
+        ORDER BY m.id
+        LIMIT {max(METER_COUNTS)};
+        """, conn)
+        interval = pd.read_sql(f"""
+        SELECT MAX(hh.date) - INTERVAL '365 DAY' AS start_date, MAX(hh.date) AS end_date
+        FROM usage_management.history_hourly hh
+        INNER JOIN usage_management.meters m ON hh.meter_id = m.id
+        WHERE m.organization_id = {organization_id} AND hh.event_code = 'act_pwr';
+        """, conn)
+    start_date, end_date = interval['start_date'][0], interval['end_date'][0]
+
+    print(f"{'medidores':>10} {'case [s]':>10} {'long [s]':>10}")
+    for n in METER_COUNTS:
+        subset = meters.head(n)
+        if len(subset) < n:
+            print(f'{n:>10} la organización solo tiene {len(subset)} medidores')
+            break
+        case_seconds = timed(get_data, subset, organization_id, start_date, end_date, 'act_pwr', mode='case', repeat=1)
+        long_seconds = timed(get_data, subset, organization_id, start_date, end_date, 'act_pwr', mode='long', repeat=1)
+        print(f'{n:>10} {case_seconds:>10.2f} {long_seconds:>10.2f}')
+
+
+if __name__ == '__main__':
+    bench_synthetic()
+    organization_id = os.getenv('BENCH_ORGANIZATION_ID')
+    if organization_id:
+        bench_database(int(organization_id))
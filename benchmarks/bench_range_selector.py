@@ -0,0 +1,81 @@
+'''Tiempo de seleccionar una ventana de fechas en series horarias de varios años.
+
+Uso (desde la raiz del repositorio):
+    python -m benchmarks.bench_range_selector
+    BENCH_YEARS=10 BENCH_METERS=100 python -m benchmarks.bench_range_selector
+
+Compara la version anterior de range_selector (dos mascaras booleanas sobre todo fecha y data[:-1])
+con la actual (searchsorted + slice) sobre el DF de un medidor, con MeterStore.series(name,
+min_date, max_date), que ubica la ventana en las posiciones del medidor sin construir su DF completo,
+y con la vista filtrada de todos los medidores que usan las páginas (filter_store, sin su caché).'''
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.ETL import range_selector
+from utils.filters import build_filtered
+from utils.store import MeterStore
+
+YEARS = int(os.getenv('BENCH_YEARS', 5))
+METERS = int(os.getenv('BENCH_METERS', 40))
+REPEAT = 5
+
+
+def range_selector_anterior(data, min_date, max_date):
+    min_date = pd.to_datetime(min_date)
+    max_date = pd.to_datetime(max_date)
+    data = data[(data['fecha'] >= min_date) & (data['fecha'] <= max_date+pd.Timedelta(days=1))]
+    data = data[:-1]
+    return data
+
+
+def synthetic_store(years=YEARS, meters=METERS, seed=0):
+    rng = np.random.default_rng(seed)
+    fecha = pd.date_range('2020-01-01', periods=years * 365 * 24, freq='h')
+    long_df = pd.DataFrame({
+        'fecha': np.tile(fecha, meters),
+        'meter_id': np.repeat(np.arange(meters), len(fecha)),
+        'value': rng.gamma(2.0, 10.0, len(fecha) * meters),
+    })
+    names = pd.DataFrame({'meter_id': np.arange(meters), 'meter_name': [f'medidor{i}' for i in range(meters)]})
+    return MeterStore.from_long(long_df, names).freeze()
+
+
+def timed(func):
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    store = synthetic_store()
+    frames = {name: store.frame(name) for name in store.columns}
+    last = pd.Timestamp(store.index[-1]).date()
+    windows = {
+        'ultimo mes': (last - pd.Timedelta(days=30), last),
+        'ultimo año': (last - pd.Timedelta(days=365), last),
+        'todo': (pd.Timestamp(store.index[0]).date(), last),
+    }
+
+    print(f'{YEARS} años x {METERS} medidores, {len(store.index):,} horas por medidor (mejor de {REPEAT})')
+    for label, (min_date, max_date) in windows.items():
+        anterior, rows_anterior = timed(
+            lambda: [len(range_selector_anterior(frame, min_date, max_date)) for frame in frames.values()])
+        actual, rows_actual = timed(lambda: [len(range_selector(frame, min_date, max_date)) for frame in frames.values()])
+        store_time, rows_store = timed(
+            lambda: [len(store.series(name, min_date, max_date).values) for name in store.columns])
+        key = (str(min_date), str(max_date), (), True)
+        view_time, view = timed(lambda: build_filtered(store, key, min_date, max_date, None, True) or store)
+        assert rows_actual == rows_store == np.diff(view.offsets).tolist()
+        print(f'  {label:<11} anterior {anterior * 1e3:8.2f} ms  actual {actual * 1e3:8.2f} ms  '
+              f'store {store_time * 1e3:8.2f} ms  vista {view_time * 1e3:8.2f} ms  '
+              f'filas perdidas por [:-1]: {sum(rows_actual) - sum(rows_anterior)}')
+
+
+if __name__ == '__main__':
+    main()
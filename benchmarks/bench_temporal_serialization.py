@@ -0,0 +1,67 @@
+'''Costo de serializar fecha para los charts: strftime por fila contra epoch en milisegundos.
+
+Uso (desde la raiz del repositorio):
+    python -m benchmarks.bench_temporal_serialization
+    BENCH_METERS=20 python -m benchmarks.bench_temporal_serialization
+
+Un año horario de BENCH_METERS medidores en formato largo (fecha, Medidor, value), el dato de un line
+chart como el de Comparativo_Medidores sin reducir. Se mide:
+  - preparar fecha (strftime '%Y-%m-%dT%H:%M:%S' contra epoch_ms),
+  - armar el spec de Vega-Lite con el JSON embebido (chart.to_json()) y su tamaño,
+  - el tamaño del mismo DF en Arrow IPC, que es lo que st.altair_chart envía al navegador.'''
+import os
+import time
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.plots.temporal import epoch_ms, time_x
+
+METERS = int(os.getenv('BENCH_METERS', 50))
+
+
+def arrow_size(data):
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().size
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    # st.altair_chart lifts the 5000 rows limit
+    alt.data_transformers.disable_max_rows()
+    rng = np.random.default_rng(0)
+    fecha = pd.date_range('2023-01-01', periods=365 * 24, freq='h')
+    data = pd.DataFrame({
+        'fecha': np.tile(fecha, METERS),
+        'Medidor': np.repeat([f'medidor{i}' for i in range(METERS)], len(fecha)),
+        'value': rng.gamma(2.0, 10.0, len(fecha) * METERS),
+    })
+
+    def previous():
+        prepared = data.copy()
+        prepared['fecha'] = prepared['fecha'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+        return prepared
+
+    def current():
+        return epoch_ms(data)
+
+    print(f'{len(data):,} filas ({METERS} medidores x 1 año horario)')
+    for label, prepare, x in [('strftime', previous, alt.X('fecha:T')), ('epoch ms', current, time_x('fecha'))]:
+        prepared, prepare_time = timed(prepare)
+        spec, spec_time = timed(lambda: alt.Chart(prepared).mark_line().encode(x=x, y='value:Q', color='Medidor:N').to_json())
+        print(f'  {label:<9} preparar {prepare_time * 1e3:8.1f} ms  spec {spec_time:6.2f} s  '
+              f'JSON {len(spec.encode()) / 2**20:7.1f} MB  Arrow {arrow_size(prepared) / 2**20:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
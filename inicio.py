@@ -1,11 +1,18 @@
+import os
+import threading
+
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from utils.ETL import * # Load all the Extract, Transform, Load functions
+from utils.derived import DERIVED_CACHE
+from utils.loader import Step, run_steps
+from utils.plots.render import get_chart_cache
 from utils.session_state import *
 
 @st.cache_data
 def get_organizations():
-    t_medidores = obtener_t_medidores()
-    organizations = t_medidores[['ID Cliente', 'Nombre Cliente']].drop_duplicates()
+    directory = get_organization_directory()
+    organizations = directory[['ID Cliente', 'Nombre Cliente']].drop_duplicates()
     organizations = organizations.dropna(subset=['ID Cliente'])
     organizations.sort_values(by='ID Cliente', inplace=True)
     organizations_list = [name for name in organizations['Nombre Cliente'] if name is not None]
@@ -18,19 +25,43 @@ def get_organization_id(organization_select, organizations):
 
 @st.cache_data
 def get_inmuebles(organization_id):
-    t_medidores = obtener_t_medidores()
-    t_medidores = t_medidores[t_medidores['ID Cliente'] == organization_id]
-
+    # listing from meter metadata plus an existence check, no energy history is downloaded
     with st.spinner("Cargando inmuebles de la organización..."):
-        organization_data = get_organization_data(organization_id)
-        consulta = combinacion_consultas(organization_data, t_medidores)
-        inmuebles = conocer_id_inmuebles(consulta)
+        inmuebles = get_active_inmuebles(organization_id)
     return inmuebles
 
 def get_inmueble_id(inmueble_select, inmuebles):
     inmueble_id = inmuebles[inmuebles['Nombre Inmueble'] == inmueble_select]['ID Inmueble'].values[0]
     return inmueble_id
 
+def load_steps(organization_id, inmueble_id):
+    # data load of an inmueble as a dependency graph, independent queries run at the same time
+    def descendants(tree):
+        # only the subtree of the selected inmueble is needed
+        return {inmueble_id: tree.descendants(inmueble_id)}
+
+    def data(meters_location, interval):
+        # power and energy come from a single scan of history_hourly, kept as compact MeterStores
+        # whose columns are the meter names without points/dots, as the pages look them up
+        # the stores are shared read-only with every other session looking at the same inmueble
+        meters = meters_location.assign(meter_name=meters_location['meter_name'].str.replace('.', ''))
+        return get_shared_stores(meters, organization_id, inmueble_id, interval['min_date'][0], interval['max_date'][0],
+                                 ['act_pwr', 'act_ene'])
+
+    steps = {
+        'tree': Step(lambda: get_location_tree(organization_id), timeout=60),
+        'interval': Step(lambda: get_interval(organization_id), timeout=120),
+        'descendants': Step(descendants, deps=('tree',)),
+        'meters_location': Step(lambda descendants: get_meters_names(inmueble_id, descendants, organization_id),
+                                deps=('descendants',), timeout=60),
+        'data': Step(data, deps=('meters_location', 'interval'), timeout=600),
+    }
+    if os.getenv("DESCENDANTS_MODE") == 'sql':
+        # subtree resolved by Postgres with a recursive CTE
+        steps['descendants'] = Step(lambda: {inmueble_id: get_descendants_sql(organization_id, inmueble_id)},
+                                    timeout=60)
+    return steps
+
 def main():
     st.set_page_config(
         page_title="Analisis exploratorio",
@@ -102,17 +133,27 @@ def main():
             # spinner to wait for the data to load
             with st.spinner("Cargando datos de energía y potencia..."):
 
-                meters = get_meters(organization_id)
-                hierarchy = build_hierarchy(meters)
-
-                # IDs of the parent entities
-                parent_ids = meters[meters['parent_id'].isnull()]['id']
-                parent_ids_list = parent_ids.tolist()
+                ctx = get_script_run_ctx()
+                report = run_steps(
+                    load_steps(organization_id, inmueble_id),
+                    initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+                )
+                if report['errors']:
+                    for step, error in report['errors'].items():
+                        st.error(f"Error cargando {step}: {error}")
+                    st.stop()
+
+                results = report['results']
+                meters = get_location_tree(organization_id).locations
+                meters_location = results['meters_location']
+                interval = results['interval']
+                min_date = interval['min_date'][0]
+                max_date = interval['max_date'][0]
+                power_df = results['data']['act_pwr']
+                energy_df = results['data']['act_ene']
+                st.caption(f"Carga en {report['wall_time']:.1f} s, ruta crítica "
+                           f"{' → '.join(report['critical_path'])} ({report['critical_time']:.1f} s)")
 
-                # Getting descendants
-                descendants = get_descendants(hierarchy, parent_ids_list)
-                meters_location = get_meters_names(inmueble_id, descendants)
-                
                 # get unique location_id of meters_location as a list
                 unique_location_ids = meters_location['location_id'].unique().tolist()
                 
@@ -123,28 +164,31 @@ def main():
                     if row['id'] in unique_location_ids:
                         systems[row['name']] = row['id']
 
-                interval = get_interval(organization_id)
-                min_date = interval['min_date'][0]
-                max_date = interval['max_date'][0]
-
-                
-                power_df = get_power_data(meters_location, organization_id, min_date, max_date)
-                energy_df = get_ener_data(meters_location, organization_id, min_date, max_date)
-
-                # for each column in power_df and energy_df, if there are points/dots on the column name, replace them nothing
-                power_df.columns = power_df.columns.str.replace(".", "")
-                energy_df.columns = energy_df.columns.str.replace(".", "")
                 # Save the data to the session state
                 st.write("## Datos de Potencia")
-                power_df
+                st.dataframe(power_df.summary())
                 st.write("## Datos de Energía")
-                energy_df
+                st.dataframe(energy_df.summary())
+                st.caption(f"Memoria de la sesión: {(power_df.nbytes + energy_df.nbytes) / 2**20:.1f} MB")
                 session_state.meters_location = meters_location
                 session_state.systems = systems
                 session_state.power_df = power_df
                 session_state.energy_df = energy_df
                 session_state.min_date = min_date
                 session_state.max_date = max_date
+
+    # connection pool metrics shared by every session of this process
+    with st.sidebar.expander("Conexiones a la base de datos"):
+        st.json(pool_stats())
+    # shared dataset registry, hits/misses/evictions across sessions
+    with st.sidebar.expander("Caché de datos"):
+        st.json(get_dataset_registry().stats())
+        # filtered views, cubes, histograms and PNGs of those datasets, with their own budget
+        st.caption("Resultados derivados")
+        st.json(DERIVED_CACHE.stats())
+    # chart specs reused across reruns and sessions
+    with st.sidebar.expander("Caché de gráficos"):
+        st.json(get_chart_cache().stats())
                 
 if __name__ == "__main__":
     main()
\ No newline at end of file
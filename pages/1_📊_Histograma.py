@@ -1,7 +1,10 @@
 import streamlit as st
 
 from utils.ETL import *
+from utils.filters import *
+from utils.histograms import *
 from utils.plots.Histograma import *
+from utils.plots.render import *
 from utils.session_state import *
 
 # filter by location_id session_state.meters_location by location_id
@@ -24,9 +27,20 @@ if session_state.energy_df is None:
 else:
     st.markdown(f"# Histogramas de demanda de potencia del cliente{session_state.organization_select}")
     st.sidebar.header("Histogramas de demanda de potencia")
+    # how the bins are chosen, fixed count per meter, Freedman–Diaconis or the same edges for every meter
+    strategy = st.sidebar.selectbox("Bins del histograma", list(BIN_STRATEGIES))
+    bins = 10
+    if BIN_STRATEGIES[strategy] != 'fd':
+        bins = int(st.sidebar.number_input("Cantidad de bins", min_value=2, max_value=MAX_BINS, value=10))
     st.write(
         """Histogramas de demanda de potencia del cliente seleccionado."""
     )    
+    # sidebar selection applied once to every meter, each plot gets its column from the view
+    view = session_view(session_state.power_df, session_state)
+    # histograms of every meter in one pass, cached with the view
+    histograms = get_histograms(view, BIN_STRATEGIES[strategy], bins)
+    # only the meters of the current page are computed and drawn
+    visible_meters = meters_pager(session_state, 'Histograma')
     # plot the histogram
     for key, value in session_state.systems.items():
 
@@ -35,9 +49,12 @@ else:
         filter_df['meter_name'] = filter_df['meter_name'].str.replace('.', '')
         num_meters = len(filter_df['meter_name'])
         for meter in filter_df['meter_name']:
+            if meter not in visible_meters:
+                continue
             try:
-                fig = plot_histogram_altair(session_state.power_df, meter, session_state= session_state)
-                st.altair_chart(fig, use_container_width=True)
+                # built only when the meter, filters or bins changed since the chart was cached
+                show_cached_chart(chart_key(session_state.power_df, 'histograma', meter, session_state, params=(strategy, bins)),
+                                  lambda: plot_histogram_altair(histograms, meter, session_state= session_state), meter)
             except Exception as e:
                 st.warning(f"El medidor {meter} no tiene datos de potencia")
                 print(e)
@@ -1,7 +1,9 @@
 import streamlit as st
 
 from utils.ETL import *
+from utils.filters import *
 from utils.plots.Boxplot_Diario import *
+from utils.plots.render import *
 from utils.session_state import *
 
 # filter by location_id session_state.meters_location by location_id
@@ -27,6 +29,10 @@ else:
     st.write(
         """Boxplot de perfil semanal del cliente seleccionado."""
     )
+    # sidebar selection applied once to every meter, each plot gets its column from the view
+    view = session_view(session_state.energy_df, session_state)
+    # only the meters of the current page are computed and drawn
+    visible_meters = meters_pager(session_state, 'Boxplot_Diario')
     # plot the histogram
     for key, value in session_state.systems.items():
 
@@ -35,10 +41,13 @@ else:
         num_meters = len(filter_df['meter_name'])
 
         for meter in filter_df['meter_name']:
+            if meter not in visible_meters:
+                continue
 
             try:
-                fig = plot_daily_boxplot_altair(session_state.energy_df, meter, session_state= session_state)
-                st.altair_chart(fig, use_container_width=True)
+                # built only when the meter or filters changed since the chart was cached
+                show_cached_chart(chart_key(session_state.energy_df, 'boxplot_diario', meter, session_state),
+                                  lambda: plot_daily_boxplot_altair(view.frame(meter), meter, session_state= session_state), meter)
             except Exception as e:
                 st.warning(f"El medidor {meter} no tiene datos de potencia")
                 print(e)
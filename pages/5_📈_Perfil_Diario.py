@@ -1,7 +1,10 @@
 import streamlit as st
 
 from utils.ETL import *
+from utils.cube import *
+from utils.filters import *
 from utils.plots.Perfil_Diario import *
+from utils.plots.render import *
 from utils.session_state import *
 
 # filter by location_id session_state.meters_location by location_id
@@ -24,9 +27,18 @@ else:
 
     st.markdown(f"# Perfil de demanda diario del cliente{session_state.organization_select}")
     st.sidebar.header("Perfil de demanda diario")
+    # percentile bands around the hourly median and a few real days drawn on top
+    bands = st.sidebar.multiselect("Bandas de percentiles", list(PROFILE_BANDS), ['P10–P90', 'P25–P75'])
+    n_sample_days = int(st.sidebar.number_input("Días de muestra", min_value=0, max_value=7, value=0))
     st.write(
         """Perfil de demanda diario del cliente seleccionado."""
     )
+    # sidebar selection applied once to every meter, each plot gets its column from the view
+    view = session_view(session_state.power_df, session_state)
+    # hourly statistics of every meter in one pass, cached with the view
+    cube = get_cube(view)
+    # only the meters of the current page are computed and drawn
+    visible_meters = meters_pager(session_state, 'Perfil_Diario')
     # plot the histogram
     for key, value in session_state.systems.items():
 
@@ -34,9 +46,14 @@ else:
         filter_df['meter_name'] = filter_df['meter_name'].str.replace('.', '')
         num_meters = len(filter_df['meter_name'])
         for meter in filter_df['meter_name']:
+            if meter not in visible_meters:
+                continue
             try:
-                fig = plot_power_profile_daily_altair(session_state.power_df, meter, session_state= session_state)
-                st.altair_chart(fig, use_container_width=True)
+                # built only when the meter, filters or bands changed since the chart was cached
+                show_cached_chart(chart_key(session_state.power_df, 'perfil_diario', meter, session_state,
+                                            params=(tuple(bands), n_sample_days)),
+                                  lambda: plot_power_profile_daily_altair(view.frame(meter), cube, meter, session_state= session_state,
+                                                                          bands=bands, n_sample_days=n_sample_days), meter)
             except Exception as e:
                 st.warning(f"El medidor {meter} no tiene datos de potencia")
                 print(e)
@@ -2,6 +2,7 @@ import streamlit as st
 
 from utils.ETL import *
 from utils.plots.Consumo_Ultimos_Meses import *
+from utils.plots.png import *
 from utils.session_state import *
 
 # filter by location_id session_state.meters_location by location_id
@@ -28,6 +29,13 @@ else:
     st.write(
         """Consumo Historico mensual del cliente seleccionado."""
     )
+    # only the meters of the current page are computed and drawn
+    visible_meters = meters_pager(session_state, 'Consumo_Ultimos_Meses')
+    # the figures of the page drawn at once in the process pool, their PNGs cached per dataset and filter
+    energy_df = session_state.energy_df
+    images, errors = render_pngs(energy_df, 'consumo_mensual', visible_meters,
+                                 lambda meter: monthly_energy_data(energy_df.frame(meter), meter, session_state) if meter in energy_df else None,
+                                 monthly_energy_figure, params=(session_state.zero_values,))
     # plot the histogram
     for key, value in session_state.systems.items():
 
@@ -36,9 +44,14 @@ else:
         num_meters = len(filter_df['meter_name'])
 
         for meter in filter_df['meter_name']:
-
-            fig = plot_monthly_energy(session_state.energy_df, meter, session_state= session_state)
-            # Display the plot using Streamlit's plotting function
-            st.pyplot(fig)
-            # Close the plot
-            plt.close()
+            if meter not in visible_meters:
+                continue
+
+            if meter in errors:
+                st.error(f"No se pudo dibujar el medidor {meter}: {errors[meter]}")
+                continue
+            if images[meter] is None:
+                st.warning(f"El medidor {meter} no tiene datos de consumo")
+                continue
+            # Display the PNG drawn in the pool
+            st.image(images[meter], use_column_width=True)
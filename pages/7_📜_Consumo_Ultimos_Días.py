@@ -1,7 +1,9 @@
 import streamlit as st
 
 from utils.ETL import *
+from utils.filters import *
 from utils.plots.Consumo_Ultimos_Dias import *
+from utils.plots.render import *
 from utils.session_state import *
 
 # filter by location_id session_state.meters_location by location_id
@@ -26,6 +28,10 @@ else:
     st.write(
         """Consumo Historico ultimos días del cliente seleccionado."""
     )
+    # only the date range of the sidebar applies to this page, each plot gets its column from the view
+    view = session_view(session_state.energy_df, session_state, days=False, zeros=False)
+    # only the meters of the current page are computed and drawn
+    visible_meters = meters_pager(session_state, 'Consumo_Ultimos_Dias')
     # plot the histogram
     for key, value in session_state.systems.items():
         
@@ -34,6 +40,9 @@ else:
         num_meters = len(filter_df['meter_name'])
 
         for meter in filter_df['meter_name']:
+            if meter not in visible_meters:
+                continue
 
-            fig = plot_diary_energy_altair(session_state.energy_df, meter, session_state= session_state)
-            st.altair_chart(fig, use_container_width=True)
+            # built only when the meter or filters changed since the chart was cached
+            show_cached_chart(chart_key(session_state.energy_df, 'consumo_ultimos_dias', meter, session_state),
+                              lambda: plot_diary_energy_altair(view.frame(meter), meter, session_state= session_state), meter)
@@ -1,7 +1,10 @@
 import streamlit as st
 
 from utils.ETL import *
+from utils.cube import *
+from utils.filters import *
 from utils.plots.Matriz_Horaria_Consumos import *
+from utils.plots.png import *
 from utils.session_state import *
 
 # filter by location_id session_state.meters_location by location_id
@@ -26,6 +29,17 @@ else:
     st.write(
         """Matriz horaria de consumos semanales del cliente seleccionado."""
     )
+    # weekday and zero filters of the sidebar applied once to every meter, the matrix never used the date
+    # range; each plot gets its column from the view
+    view = session_view(session_state.energy_df, session_state, dates=False)
+    # hourly statistics of every meter in one pass, cached with the view
+    cube = get_cube(view)
+    # only the meters of the current page are computed and drawn
+    visible_meters = meters_pager(session_state, 'Matriz_Horaria_Consumos')
+    # the figures of the page drawn at once in the process pool, their PNGs cached per dataset and filter
+    images, errors = render_pngs(view, 'matriz_horaria', visible_meters,
+                                 lambda meter: hourly_matrix_data(cube, meter, session_state) if meter in view else None,
+                                 hourly_matrix_figure, params=(session_state.zero_values,))
     # plot the histogram
     for key, value in session_state.systems.items():
 
@@ -34,9 +48,14 @@ else:
         num_meters = len(filter_df['meter_name'])
 
         for meter in filter_df['meter_name']:
-
-            fig = plot_hourly_matrix(session_state.energy_df, meter, session_state= session_state)
-            # Display the plot using Streamlit's plotting function
-            st.pyplot(fig)
-            # Close the plot
-            plt.close()
+            if meter not in visible_meters:
+                continue
+
+            if meter in errors:
+                st.error(f"No se pudo dibujar el medidor {meter}: {errors[meter]}")
+                continue
+            if images[meter] is None:
+                st.warning(f"El medidor {meter} no tiene datos de consumo")
+                continue
+            # Display the PNG drawn in the pool
+            st.image(images[meter], use_column_width=True)
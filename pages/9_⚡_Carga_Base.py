@@ -1,6 +1,7 @@
 import streamlit as st
 
 from utils.ETL import *
+from utils.filters import *
 from utils.plots.Carga_Base import *
 from utils.session_state import *
 
@@ -50,33 +51,15 @@ else:
     meter_select = st.sidebar.selectbox("Seleccionar medidor", meters_list)
     session_state.meter_select = meter_select
 
-    base_load_df = session_state.energy_df.copy()
-
-    # just keep fecha and meter_select columns
-    base_load_df = base_load_df[['fecha', meter_select]]
-
-    base_load_df['fecha'] = pd.to_datetime(base_load_df['fecha'])
-    
-    # Filter out rows where the specified column has NaN values
-    base_load_df = base_load_df.dropna(subset=[meter_select])
-
-    if session_state and not session_state.zero_values:
-        # Erase 0 values from the base_load_df
-        base_load_df = base_load_df[base_load_df[meter_select] != 0]
-
-    # filter the base_load_df to just get the date range selected
-    base_load_df = range_selector(base_load_df, min_date=session_state.min_date, max_date=session_state.max_date)
-
-    # filter the base_load_df to just get the days of the week selected
-    if session_state.days:
-        base_load_df = base_load_df[base_load_df['fecha'].dt.dayofweek.isin(session_state.days)]
+    # just keep fecha and meter_select columns, already filtered with the sidebar selection
+    base_load_df = session_view(session_state.energy_df, session_state).frame(meter_select)
 
     if base_load_df.empty:
         print(f"No valid data for meter_select '{meter_select}'.")
         pass
 
     # get the max and min values of the column selected
-    max_value = base_load_df[meter_select].max()
+    max_value = float(base_load_df[meter_select].max())
     # min_value = base_load_df[meter_select].min()
 
     # set a range selector on the sidebar to get the max and min values of the column selected
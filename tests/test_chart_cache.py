@@ -0,0 +1,30 @@
+import pandas as pd
+
+from utils.chart_cache import ChartCache, spec_nbytes
+
+
+def spec(rows):
+    return {'mark': 'line', 'data': {'name': 'data-0'},
+            'datasets': {'data-0': pd.DataFrame({'x': range(rows), 'y': [0.0] * rows})}}
+
+
+def test_spec_size_counts_the_embedded_frames():
+    assert spec_nbytes(spec(10_000)) > 10_000 * 16 > spec_nbytes(spec(10))
+
+
+def test_cache_is_bounded_by_bytes():
+    cache = ChartCache(budget_bytes=3 * spec_nbytes(spec(10_000)))
+    for key in range(5):
+        cache.put(key, spec(10_000))
+    stats = cache.stats()
+    assert stats['specs'] == 3
+    assert stats['evictions'] == 2
+    assert stats['nbytes'] <= stats['budget_bytes']
+    assert cache.get(0) is None and cache.get(4) is not None
+
+
+def test_spec_larger_than_the_budget_is_kept():
+    cache = ChartCache(budget_bytes=1)
+    cache.put('a', spec(10))
+    cache.put('b', spec(10))
+    assert cache.get('a') is None and cache.get('b') is not None
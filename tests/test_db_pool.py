@@ -0,0 +1,79 @@
+import gc
+
+import pytest
+
+from utils import ETL, db_pool
+from utils.db_pool import ConnectionPool
+
+
+class FailingCursor:
+    # every query fails, like a bad query, a timeout or a dropped connection
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        raise RuntimeError('query failed')
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    closed = 0
+
+    def cursor(self):
+        return FailingCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', lambda **kwargs: FakeConnection())
+    return ConnectionPool({}, maxconn=2, timeout=0.2)
+
+
+def test_failed_query_in_with_block_returns_the_connection(pool):
+    for _ in range(pool.maxconn + 1):
+        with pytest.raises(RuntimeError):
+            with pool.getconn() as conn:
+                conn.cursor().execute('SELECT 1')
+    assert pool.stats()['in_use'] == 0
+    pool.getconn().close()
+
+
+def test_connection_dropped_without_close_is_returned(pool):
+    conn = pool.getconn()
+    assert pool.stats()['in_use'] == 1
+    del conn
+    gc.collect()
+    assert pool.stats()['in_use'] == 0
+
+
+def test_failed_etl_queries_return_their_connections(pool, monkeypatch):
+    monkeypatch.setattr(ETL, 'get_pool', lambda database='plataforma': pool)
+    queries = [
+        lambda: ETL.get_interval(1),
+        lambda: ETL.get_meters(1),
+        lambda: ETL.get_meters_with_recent_data(1),
+        lambda: ETL.get_available_variables(1),
+        lambda: ETL.get_t_medidores_columns(),
+        lambda: ETL.get_data(ETL.pd.DataFrame({'meter_id': [1], 'meter_name': ['m1']}), 1,
+                             '2024-01-01', '2024-02-01', 'act_pwr', mode='case'),
+    ]
+    for query in queries:
+        with pytest.raises(Exception):
+            query()
+        assert pool.stats()['in_use'] == 0
+    # more failures than slots and the pool still lends connections
+    pool.getconn(timeout=0).close()
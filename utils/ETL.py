@@ -1,51 +1,85 @@
 from azure.storage.blob import BlobClient #para acceder al blob storage en Azure
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import psycopg2
 import streamlit as st
+from utils.bulk_reader import arrow_to_frame, copy_to_arrow
+from utils.db_pool import ConnectionPool
+from utils.hierarchy import LocationTree, MeterIndex, build_descendants_query, build_meters_locations_query
+from utils.history_cache import load_history
+from utils.registry import DatasetRegistry
+from utils.store import MeterStore, window_bounds
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
+# columns of azure_tables.t_medidores, in table order
+T_MEDIDORES_COLUMNS = ['ID Medidor',"Nombre Medidor","ID Sistema","Sistema Equipo","ID Inmueble","Nombre Inmueble","ID Cliente","Nombre Cliente","Jerarquía","Parent ID","Nombre Parent","Estado medidor","Nombre DU","ID Línea-Planta-Piso","Nombre Línea-Planta-Piso","Serial","Column1","Agrupación recobro","ID Equipo","Equipos","Servicio","Simular","Jerarquia Simulada"]
+
+@st.cache_resource(ttl=3600)
+def get_t_medidores_columns():
+    # physical column name behind each name of T_MEDIDORES_COLUMNS, read from the catalog
+    # the with block gives the connection back to the pool even if the query fails
+    with get_connection('activa') as connection:
+        cursor = connection.cursor()
+        cursor.execute('''SELECT column_name
+FROM information_schema.columns
+WHERE table_schema = 'azure_tables' AND table_name = 't_medidores'
+ORDER BY ordinal_position;''')
+        physical = [row[0] for row in cursor.fetchall()]
+    return dict(zip(T_MEDIDORES_COLUMNS, physical))
+
 @st.cache_data
-def obtener_t_medidores(): 
+def obtener_t_medidores(columns=None, client_id=None): 
     '''Función que se conecta a la ETL para traer el t_medidores.
        ---------------------------------------------------------------------------------
        Parameters
-       None
+       columns: list
+                  Columnas de T_MEDIDORES_COLUMNS a traer. None trae todas.
+       client_id: int
+                  Filtra en SQL por ID Cliente. None trae todos los clientes.
        ---------------------------------------------------------------------------------
        Return
        tabla_medidores: DF
                   Tabla de azure de t_medidores que esta almacenado en el DWH Analitica.'''
-    #Conexion a ACTIVA
-
-    connection = psycopg2.connect(
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-                host=os.getenv("DB_HOST"),
-                port=os.getenv("DB_PORT"),
-                database=os.getenv("DB_NAME")
-    )
-
-    # Creacion de un cursor para hacer operaciones sobre la base de datos
-    cursor = connection.cursor()
-    
-    
-    # Consulta SQL 
-    query = '''(SELECT *
-FROM azure_tables.t_medidores); '''
-
-    # Ejecucion de la consulta
-    cursor.execute(query)
-
-    #Almacenamiento de los datos
-    tabla_medidores = cursor.fetchall()
+    columns = list(columns or T_MEDIDORES_COLUMNS)
+    physical = get_t_medidores_columns()
+
+    # only the requested columns travel, renamed to the names used in the app
+    select = ", ".join(f'"{physical[column]}" AS "{column}"' for column in columns)
+    query = f'''SELECT {select}
+FROM azure_tables.t_medidores'''
+    params = None
+    if client_id is not None:
+        query += f'''
+WHERE "{physical['ID Cliente']}" = %s'''
+        params = (np.asarray(client_id).item(),)
+
+    #Conexion a ACTIVA, devuelta al pool al salir del with aunque la consulta falle
+    with get_connection('activa') as connection:
+
+        # Creacion de un cursor para hacer operaciones sobre la base de datos
+        cursor = connection.cursor()
+
+        # Ejecucion de la consulta
+        cursor.execute(query, params)
+
+        #Almacenamiento de los datos
+        tabla_medidores = cursor.fetchall()
     
     #convertir datos a dataframe
-    tabla_medidores = pd.DataFrame(tabla_medidores, columns = ['ID Medidor',"Nombre Medidor","ID Sistema","Sistema Equipo","ID Inmueble","Nombre Inmueble","ID Cliente","Nombre Cliente","Jerarquía","Parent ID","Nombre Parent","Estado medidor","Nombre DU","ID Línea-Planta-Piso","Nombre Línea-Planta-Piso","Serial","Column1","Agrupación recobro","ID Equipo","Equipos","Servicio","Simular","Jerarquia Simulada"])
-    connection.close()
+    tabla_medidores = pd.DataFrame(tabla_medidores, columns = columns)
     return tabla_medidores
 
+@st.cache_resource(ttl=3600)
+def get_organization_directory():
+    # compact organization -> inmueble directory shared by every session (no per call unpickling)
+    directory = obtener_t_medidores(columns=('ID Cliente', 'Nombre Cliente', 'ID Inmueble', 'Nombre Inmueble'))
+    directory = directory.dropna(subset=['ID Cliente']).drop_duplicates().reset_index(drop=True)
+    return directory
+
 
 def obtener_datos_AZURE(): #obtiene Tablas Generales desde Azure
     
@@ -69,19 +103,58 @@ def obtener_estilo_AZURE(): #obtiene estilo desde Azure
         blob_data = blob.download_blob()
         blob_data.readinto(my_blob)
 
-def get_connection():
-    conn = psycopg2.connect(
-        host=os.getenv("DB_HOST2"),
-        port=os.getenv("DB_PORT2"),
-        dbname=os.getenv("DB_NAME2"), 
-        user=os.getenv("DB_USER2"), 
-        password=os.getenv("DB_PASSWORD2"))
-    
-    return conn
+# credentials of each database, ACTIVA (DWH Analitica) and the platform database
+DATABASES = {
+    'activa': {'host': 'DB_HOST', 'port': 'DB_PORT', 'dbname': 'DB_NAME', 'user': 'DB_USER', 'password': 'DB_PASSWORD'},
+    'plataforma': {'host': 'DB_HOST2', 'port': 'DB_PORT2', 'dbname': 'DB_NAME2', 'user': 'DB_USER2', 'password': 'DB_PASSWORD2'},
+}
+
+@st.cache_resource
+def get_pool(database='plataforma'):
+    # one pool per database shared by every Streamlit session of the process
+    connect_kwargs = {key: os.getenv(env) for key, env in DATABASES[database].items()}
+    return ConnectionPool(
+        connect_kwargs,
+        maxconn=int(os.getenv("DB_POOL_SIZE", 8)),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+        max_idle=float(os.getenv("DB_POOL_MAX_IDLE", 60)),
+    )
+
+def get_connection(database='plataforma'):
+    # borrowed from the pool, conn.close() gives it back
+    return get_pool(database).getconn()
+
+def pool_stats():
+    return {database: get_pool(database).stats() for database in DATABASES}
+
+# column types of the COPY based readers
+HISTORY_SCHEMA = pa.schema([
+    ('fecha', pa.timestamp('us')),
+    ('meter_id', pa.string()),
+    ('event_code', pa.string()),
+    ('value', pa.float64()),
+])
+
+ORGANIZATION_DATA_SCHEMA = pa.schema([
+    ('organization_id', pa.int64()),
+    ('id_medidor', pa.string()),
+    ('nombre del medidor', pa.string()),
+    ('variable', pa.string()),
+    ('valor', pa.float64()),
+    ('fecha', pa.timestamp('us')),
+])
+
+def read_copy(query, schema, database='plataforma'):
+    # bulk read through COPY ... TO STDOUT, peak memory is one block plus the final columns
+    conn = get_connection(database)
+    try:
+        table = copy_to_arrow(conn, query, schema)
+    finally:
+        conn.close()
+    return arrow_to_frame(table)
 
 # get interval
 def get_interval(organization_id):
-    conn = get_connection()
     query = f"""
     SELECT
         MIN(hh.date) AS Min_Date,
@@ -94,40 +167,31 @@ def get_interval(organization_id):
         m.organization_id = {organization_id}
         AND hh.event_code = 'act_pwr';
     """
-    interval = pd.read_sql_query(query, conn)
-    conn.close()
+    with get_connection() as conn:
+        interval = pd.read_sql_query(query, conn)
     return interval
 
 
 def get_meters(organization_id):
-    conn = get_connection()
     query = f"""
     SELECT id, parent_id, name 
     FROM organizations.locations l 
     WHERE organization_id = {organization_id};
     """
-    df = pd.read_sql(query, conn)
-    conn.close()
+    with get_connection() as conn:
+        df = pd.read_sql(query, conn)
     return df
 
 def get_organization_data(organization_id): #obtiene los datos del organizacion id
 
-    # construct a string with the variables separated by commas and surrounded by single quotes like 'act_pwr', 'act_ene'
-    # variables_str = ", ".join([f"'{variable}'" for variable in variables])
-    #Conexion a Plataforma
-    conn = get_connection()
-
-    # Creacion de un cursor para hacer operaciones sobre la base de datos
-    cursor = conn.cursor()
-        
     # Consulta SQL 
-    query = f'''(SELECT
+    query = f'''SELECT
     organization_id,
     meter_id as "id_medidor",
     name as "nombre_medidor",
     event_code as "variable",
     value as valor,
-    date
+    date::timestamp AS date
 FROM
     usage_management.history_hourly
 
@@ -140,110 +204,112 @@ AND (
     event_code = 'act_ene'
 )
 AND (
-    organization_id =)
-    ); '''
-    
-    query = query.replace("organization_id =", "organization_id = " + str(organization_id)) #se añade el organization_id
+    organization_id = {organization_id}
+    )'''
 
-    # Ejecucion de la consulta
-    cursor.execute(query)
+    # COPY streamed in blocks straight into columns, without a list of tuples in between
+    datos = read_copy(query, ORGANIZATION_DATA_SCHEMA)
+    return datos
 
-    #Almacenamiento de los datos
-    datos = cursor.fetchall()
-    
-    #convertir datos a dataframe
-    datos = pd.DataFrame(datos, columns =[ 'organization_id', 'id_medidor', 'nombre del medidor',
-                                          'variable', 'valor', 'fecha'])
+# descriptive columns of t_medidores kept by combinacion_consultas
+COLUMNAS_DESCRIPTIVAS = ['Nombre DU', 'Nombre Inmueble', 'Sistema Equipo', 'Nombre Cliente', 'Estado medidor']
 
-    conn.close()
-    return datos
+def limpiar_medidores(t_medidores): #filtros de combinacion_consultas aplicados sobre la tabla de medidores
+    #una sola mascara: Jerarquía e ID Inmueble numericos, ID Inmueble entero no negativo y medidor activo
+    jerarquia = pd.to_numeric(t_medidores['Jerarquía'], errors='coerce')
+    id_inmueble = pd.to_numeric(t_medidores['ID Inmueble'], errors='coerce')
+    mask = (jerarquia.notna() & id_inmueble.notna() & (id_inmueble >= 0) & (id_inmueble % 1 == 0)
+            & (t_medidores['Estado medidor'] == 'Activo'))
+
+    medidores = t_medidores[mask].copy()
+    #enteros como texto para que sean un factor, guardados como categorias
+    medidores['Jerarquía'] = jerarquia[mask].astype('int64').astype(str).astype('category')
+    medidores['ID Inmueble'] = id_inmueble[mask].astype('int64').astype(str).astype('category')
+    return medidores
 
 def combinacion_consultas(organization_data,t_medidores): #combina t_medidores y los datos de activa, ademas de aplicar algunos filtros
+    #todos los filtros dependen solo del medidor: se limpian las pocas filas de t_medidores antes del join
+    medidores = t_medidores[['ID Medidor', 'Jerarquía', 'ID Inmueble'] + COLUMNAS_DESCRIPTIVAS]
+    medidores = limpiar_medidores(medidores)
+    medidores[COLUMNAS_DESCRIPTIVAS] = medidores[COLUMNAS_DESCRIPTIVAS].fillna(0)
+    for columna in COLUMNAS_DESCRIPTIVAS:
+        medidores[columna] = medidores[columna].astype('category')
+
     #inner join, es decir que toma la interseccion de los conjuntos
-    consulta_combinada = pd.merge(left = organization_data, right = t_medidores, left_on = 'id_medidor', right_on = 'ID Medidor', 
-                                 how = "inner") 
-    #selecciona las columnas
+    datos = organization_data[['id_medidor', 'variable', 'valor', 'fecha']]
+    consulta_combinada = pd.merge(left = datos, right = medidores, left_on = 'id_medidor', right_on = 'ID Medidor', 
+                                 how = "inner")
     #selecciona las columnas
     consulta_combinada = consulta_combinada[['id_medidor', 'variable', 'valor', 'fecha', 
                                              'Nombre DU', 'Jerarquía', 'Nombre Inmueble', 'Sistema Equipo',
                                              'ID Inmueble', 'Nombre Cliente', 'Estado medidor']] 
-    #cambiar jerarquía a un str 
-    consulta_combinada["Jerarquía"] = consulta_combinada["Jerarquía"].astype(str)
-    consulta_combinada = consulta_combinada[consulta_combinada["Jerarquía"] != 'nan'] #elimina los 'nan' de Jerarquía
-    consulta_combinada["Jerarquía"] = consulta_combinada["Jerarquía"].astype(float) #convierte a flot 
-    consulta_combinada["Jerarquía"] = consulta_combinada["Jerarquía"].astype(int) #eliminar punto decimal
-    consulta_combinada["Jerarquía"] = consulta_combinada["Jerarquía"].astype(str) #otra vez str para que sea un factor
-    
-    ## verificar que ID inmueble es un str
-    
-    consulta_combinada["ID Inmueble"] = consulta_combinada["ID Inmueble"].astype(str)
-    consulta_combinada = consulta_combinada[consulta_combinada["ID Inmueble"] != 'nan'] #elimina los 'nan' de ID Inmueble
-    # check if there is a string in the column ID Inmueble that is not a number neither int or float and remove it
-    consulta_combinada = consulta_combinada[consulta_combinada["ID Inmueble"].apply(lambda x: x.isnumeric())]
-    consulta_combinada["ID Inmueble"] = consulta_combinada["ID Inmueble"].astype(float) #convierte a flot 
-    consulta_combinada["ID Inmueble"] = consulta_combinada["ID Inmueble"].astype(int) #eliminar punto decimal
-    consulta_combinada["ID Inmueble"] = consulta_combinada["ID Inmueble"].astype(str) #otra vez str para que sea un factor
-    
-    
-    #filtra medidores activos
-    consulta_combinada = consulta_combinada[consulta_combinada['Estado medidor'] == 'Activo']
-    consulta_combinada = consulta_combinada.fillna(0)
-    
-    
-    #Definir periodo
-    fecha_max = consulta_combinada.fecha.max()
-    fecha_min = consulta_combinada.fecha.min()
 
-    consulta_combinada['dia'] = consulta_combinada['fecha'].dt.dayofweek
+    #los nulos que quedan solo pueden venir de los datos
+    consulta_combinada['valor'] = consulta_combinada['valor'].fillna(0)
+    consulta_combinada['variable'] = consulta_combinada['variable'].astype('category')
+    consulta_combinada['dia'] = consulta_combinada['fecha'].dt.dayofweek.astype('int8')
     
     return consulta_combinada
 
+def get_meters_with_recent_data(organization_id, event_code='act_ene'):
+    # meters with at least one reading in the window get_organization_data uses; EXISTS stops at the first row
+    query = f"""
+    SELECT m.id AS id_medidor
+    FROM usage_management.meters m
+    WHERE m.organization_id = {organization_id}
+      AND EXISTS (
+        SELECT 1
+        FROM usage_management.history_hourly hh
+        WHERE hh.meter_id = m.id
+          AND hh.event_code = '{event_code}'
+          AND hh.date > (SELECT (TO_CHAR(NOW() - INTERVAL '120 DAY', 'yyyy-mm-01'))::date)
+      );
+    """
+    with get_connection() as conn:
+        df = pd.read_sql(query, conn)
+    return df
+
+def get_active_inmuebles(organization_id):
+    # inmuebles of the client from t_medidores metadata, kept only if one of their active meters has recent data
+    t_medidores = obtener_t_medidores(columns=('ID Medidor', 'ID Inmueble', 'Nombre Inmueble', 'Jerarquía', 'Estado medidor'),
+                                      client_id=organization_id)
+    recent = get_meters_with_recent_data(organization_id)
+
+    # same rules as combinacion_consultas, then only meters with recent data
+    medidores = limpiar_medidores(t_medidores)
+    medidores = medidores[medidores['ID Medidor'].astype(str).isin(recent['id_medidor'].astype(str))]
+    return conocer_id_inmuebles(medidores)
+
 def conocer_id_inmuebles(consulta): #funcion que imprime la lista de inmuebles de la organization_id junto al ID Inmueble
     
     inmuebles = consulta[['Nombre Inmueble', 'ID Inmueble']]
     inmuebles = inmuebles.drop_duplicates()
     return inmuebles
 
-def get_meters_names(parent_id, descendants):
-    conn = get_connection()
+@st.cache_resource(ttl=3600)
+def get_meter_index(organization_id):
+    # location -> meters of the whole organization in one query, lookups are then in memory
+    with get_connection() as conn:
+        df = pd.read_sql(build_meters_locations_query(organization_id), conn)
+    return MeterIndex(df)
+
+def get_meters_names(parent_id, descendants, organization_id, max_meters=None):
     if parent_id not in descendants:
         # Handle the case where there are no descendants for the given parent_id
         print('No descendants found for parent_id:', parent_id)
-        print('descendants:', descendants)
         return 0  # Or any other appropriate action
-    print('parent_id', parent_id)
-    print('descendant', descendants)
-    # Convert list to comma-separated string
-    descendant_ids = ', '.join(map(str, descendants[parent_id]))
-    print('descendant_ids', descendant_ids)
-    if len(descendant_ids) == 0:
-        descendant_ids = 'NULL'
-        query = f"""
-        SELECT
-            ml.location_id,
-            ml.meter_id,
-            m.name AS meter_name
-        FROM
-            usage_management.meters_locations ml
-        JOIN
-            usage_management.meters m ON ml.meter_id = m.id
-        """
-    else:
-            
-        query = f"""
-        SELECT
-            ml.location_id,
-            ml.meter_id,
-            m.name AS meter_name
-        FROM
-            usage_management.meters_locations ml
-        JOIN
-            usage_management.meters m ON ml.meter_id = m.id
-        WHERE
-            ml.location_id IN ({descendant_ids});
-        """
-    df = pd.read_sql(query, conn)
-    conn.close()
+
+    # without descendants the meters hang directly from the inmueble location
+    location_ids = descendants[parent_id] or [parent_id]
+
+    # cap the meters returned, they all become columns of the data load
+    max_meters = max_meters or int(os.getenv("METERS_LOOKUP_LIMIT", 500))
+    df = get_meter_index(organization_id).lookup(location_ids, limit=max_meters + 1)
+    if len(df) > max_meters:
+        print(f'More than {max_meters} meters under location {parent_id}, keeping the first {max_meters}')
+        st.warning(f'El inmueble tiene más de {max_meters} medidores, solo se cargan los primeros {max_meters} '
+                   '(METERS_LOOKUP_LIMIT).', icon="⚠️")
+        df = df.iloc[:max_meters]
     return df
 
 def get_descendants(data, parent_ids):
@@ -256,35 +322,40 @@ def get_descendants(data, parent_ids):
     return descendants
 
 def get_descendants_helper(node):
+    # preorder walk with an explicit stack, deep trees no longer hit the recursion limit
     descendants = []
-    for child_id, child_data in node.items():
+    stack = list(node.items())[::-1]
+    while stack:
+        child_id, child_data = stack.pop()
         descendants.append(child_id)
         if 'children' in child_data:
-            descendants.extend(get_descendants_helper(child_data['children']))
+            stack.extend(list(child_data['children'].items())[::-1])
     return descendants
 
 
 def build_hierarchy(df, parent_id=None):
-    hierarchy = {}
+    # one pass over the parent -> children adjacency arrays instead of re-filtering df at every node
+    tree = LocationTree(df)
     if pd.isnull(parent_id):
-        subset = df[df['parent_id'].isnull()]
-    else:
-        subset = df[df['parent_id'] == parent_id]
-    
-
-    for index, row in subset.iterrows():
-
-        item = {'name': row['name']}
-        children = build_hierarchy(df, parent_id=row['id'])
-        if children:
-            item['children'] = children
-            
-        hierarchy[row['id']] = item
-    return hierarchy
-
-def get_power_data(df, organization_id, start_date, end_date):
-    conn = get_connection()
-
+        return tree.to_nested()
+    return tree.to_nested(parent_id)
+
+@st.cache_resource(ttl=3600)
+def get_location_tree(organization_id, _locations=None):
+    # one LocationTree per organization shared by every session, _locations skips a second get_meters
+    if _locations is None:
+        _locations = get_meters(organization_id)
+    return LocationTree(_locations)
+
+@st.cache_data(ttl=3600)
+def get_descendants_sql(organization_id, location_id):
+    # server side alternative: the subtree is resolved by a recursive CTE on organizations.locations
+    with get_connection() as conn:
+        df = pd.read_sql(build_descendants_query(organization_id, location_id), conn)
+    return df['id'].tolist()
+
+def build_case_query(df, organization_id, start_date, end_date, event_code):
+    # legacy pivot: one SUM(CASE ...) column per meter, evaluated by Postgres
     query = """
     SELECT
       hh.date AS Fecha,"""
@@ -309,33 +380,29 @@ def get_power_data(df, organization_id, start_date, end_date):
     meter_ids = "', '".join(df['meter_id'])
     query += f"'{meter_ids}')"
     
-    query += """
-        AND hh.event_code = 'act_pwr'
+    query += f"""
+        AND hh.event_code = '{event_code}'
     GROUP BY
         hh.date
     ORDER BY
         hh.date
     """
-
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
-
-# get energy data
-def get_ener_data(df, organization_id, start_date, end_date):
-    conn = get_connection()
-
-    query = """
+    return query
+
+def build_long_query(df, organization_id, start_date, end_date, event_codes):
+    # narrow (fecha, meter_id, event_code, value) stream, the pivot is done on the client
+    if isinstance(event_codes, str):
+        event_codes = [event_codes]
+    meter_ids = "', '".join(df['meter_id'].drop_duplicates())
+    event_codes = "', '".join(event_codes)
+    query = f"""
     SELECT
-      hh.date AS Fecha,"""
-    
-    # Generate SUM(CASE...) expressions for each meter
-    for index, row in df.iterrows():
-        query += f"""
-      SUM(CASE WHEN m.id = '{row['meter_id']}' THEN hh.value END) AS "{row['meter_name']}", """
-
-    query = query.rstrip(', ')  # Remove trailing comma
-    query += f"""
+        -- naive timestamp whatever the column type, a timestamptz would COPY with an offset that
+        -- HISTORY_SCHEMA can't convert
+        hh.date::timestamp AS fecha,
+        hh.meter_id,
+        hh.event_code,
+        hh.value
     FROM
         usage_management.history_hourly hh
     INNER JOIN
@@ -343,89 +410,122 @@ def get_ener_data(df, organization_id, start_date, end_date):
     WHERE
         hh.date BETWEEN '{start_date}' AND '{end_date}'
         AND m.organization_id = {organization_id}
-        AND m.id IN ("""
-    
-    # Add meter IDs to the IN clause
-    meter_ids = "', '".join(df['meter_id'])
-    query += f"'{meter_ids}')"
-    
-    query += """
-        AND hh.event_code = 'act_ene'
-    GROUP BY
-        hh.date
-    ORDER BY
-        hh.date
+        AND m.id IN ('{meter_ids}')
+        AND hh.event_code IN ('{event_codes}')
     """
+    return query
+
+def pivot_long_data(long_df, df):
+    '''Pivota en el cliente el resultado de build_long_query.
+       ---------------------------------------------------------------------------------
+       Parameters
+       long_df: DF
+                  Columnas fecha, meter_id, value (una fila por lectura).
+       df: DF
+                  Medidores (meter_id, meter_name) en el orden de las columnas de salida.
+       ---------------------------------------------------------------------------------
+       Return
+       wide: DF
+                  Columna fecha y una columna por medidor, igual a la consulta SUM(CASE ...).'''
+    # one row per distinct date, sorted like GROUP BY / ORDER BY hh.date
+    dates, date_codes = np.unique(long_df['fecha'].to_numpy(), return_inverse=True)
+
+    # position of each reading's meter among the distinct requested meters
+    meter_index = pd.Index(df['meter_id'].drop_duplicates())
+    meter_codes = meter_index.get_indexer(long_df['meter_id'])
+
+    # SUM per (date, meter) with bincount; cells without any non null reading stay NaN like SUM(NULL)
+    values = long_df['value'].to_numpy(dtype='float64')
+    valid = ~np.isnan(values) & (meter_codes >= 0)
+    cells = date_codes[valid] * len(meter_index) + meter_codes[valid]
+    size = len(dates) * len(meter_index)
+    sums = np.bincount(cells, weights=values[valid], minlength=size)
+    counts = np.bincount(cells, minlength=size)
+    wide = np.where(counts > 0, sums, np.nan).reshape(len(dates), len(meter_index))
+
+    # one output column per row of df, repeated meters repeat their column as the CASE query did
+    wide = wide[:, meter_index.get_indexer(df['meter_id'])]
+    wide = pd.DataFrame(wide, columns=df['meter_name'].tolist())
+    wide.insert(0, 'fecha', dates)
+    return wide
+
+def get_data(df, organization_id, start_date, end_date, event_code, mode='long'):
+    # mode='long' pulls (fecha, meter_id, value) and pivots with numpy, mode='case' keeps the SQL pivot
+    if mode == 'case':
+        query = build_case_query(df, organization_id, start_date, end_date, event_code)
+        with get_connection() as conn:
+            df = pd.read_sql(query, conn)
+    else:
+        query = build_long_query(df, organization_id, start_date, end_date, event_code)
+        df = pivot_long_data(read_copy(query, HISTORY_SCHEMA), df)
 
-    df = pd.read_sql(query, conn)
-    conn.close()
     return df
 
+def get_long_history(df, organization_id, start_date, end_date, event_codes):
+    # one scan of history_hourly for every event code, long format (fecha, meter_id, event_code, value)
+    def fetch(meter_ids, start_date, end_date):
+        meters = pd.DataFrame({'meter_id': meter_ids})
+        query = build_long_query(meters, organization_id, start_date, end_date, event_codes)
+        return read_copy(query, HISTORY_SCHEMA)
+
+    cache_dir = os.getenv("HISTORY_CACHE_DIR")
+    if cache_dir:
+        # local Parquet cache, only rows newer than each meter's high-water mark are queried
+        lookback = pd.Timedelta(hours=float(os.getenv("HISTORY_CACHE_LOOKBACK_HOURS", 48)))
+        return load_history(cache_dir, organization_id, df['meter_id'].tolist(), start_date, end_date,
+                            event_codes, fetch, lookback=lookback)
+    return fetch(df['meter_id'].drop_duplicates().tolist(), start_date, end_date)
+
+def split_event_codes(long_df, event_codes):
+    groups = dict(tuple(long_df.groupby('event_code', sort=False)))
+    return {event_code: groups.get(event_code, long_df.iloc[:0]) for event_code in event_codes}
+
+def get_multi_store(df, organization_id, start_date, end_date, event_codes):
+    # one compact MeterStore per variable from a single scan, columns named by meter_name
+    long_df = get_long_history(df, organization_id, start_date, end_date, event_codes)
+    return {event_code: MeterStore.from_long(rows, df) for event_code, rows in split_event_codes(long_df, event_codes).items()}
+
+@st.cache_resource
+def get_dataset_registry():
+    # datasets shared by every session, bounded by DATASET_CACHE_MB
+    return DatasetRegistry(int(float(os.getenv("DATASET_CACHE_MB", 2048)) * 2**20))
+
+def get_shared_stores(df, organization_id, inmueble_id, start_date, end_date, event_codes):
+    # MeterStores from the shared registry, a single scan loads whatever variables are missing
+    window = (str(start_date), str(end_date))
+    keys = {event_code: (organization_id, inmueble_id, event_code, window) for event_code in event_codes}
+
+    def loader(missing):
+        missing_codes = [key[2] for key in missing]
+        stores = get_multi_store(df, organization_id, start_date, end_date, missing_codes)
+        return {keys[event_code]: store for event_code, store in stores.items()}
+
+    datasets = get_dataset_registry().get_or_load(keys.values(), loader)
+    return {event_code: datasets[key] for event_code, key in keys.items()}
+
 def range_selector(data, min_date, max_date):
+    '''Filas de data con min_date <= fecha < max_date + 1 día, es decir todas las horas de max_date.
+       Con fecha ordenada (el caso de los DF del store) la ventana se ubica con searchsorted y se toma un
+       slice; si no, se usa una máscara con los mismos límites.'''
+    fecha = pd.DatetimeIndex(data['fecha'])
+    if fecha.is_monotonic_increasing:
+        start, end = window_bounds(fecha, min_date, max_date)
+        return data.iloc[start:end]
 
-    # Filter data between min_date and max_date
     min_date = pd.to_datetime(min_date)
-
-    # convert max_date to datetime
-    max_date = pd.to_datetime(max_date)
-
-    # need to add a day to max_date to include all the hours of the last day then remove the last row 
-    data = data[(data['fecha'] >= min_date) & (data['fecha'] <= max_date+pd.Timedelta(days=1))]
-    # remove last row
-    data = data[:-1]
-
-    return data
+    max_date = pd.to_datetime(max_date) + pd.Timedelta(days=1)
+    return data[(data['fecha'] >= min_date) & (data['fecha'] < max_date)]
 
 # get available variables
 def get_available_variables(organization_id):
-    conn = get_connection()
     query = f"""
     SELECT DISTINCT hh.event_code
     FROM usage_management.history_hourly hh
     JOIN usage_management.meters m ON hh.meter_id = m.id
     WHERE m.organization_id = {organization_id};
     """
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
-
-def get_data(df, organization_id, start_date, end_date, event_code):
-    conn = get_connection()
-
-    query = """
-    SELECT
-      hh.date AS Fecha,"""
-    
-    # Generate SUM(CASE...) expressions for each meter
-    for index, row in df.iterrows():
-        query += f"""
-      SUM(CASE WHEN m.id = '{row['meter_id']}' THEN hh.value END) AS "{row['meter_name']}", """
-
-    query = query.rstrip(', ')  # Remove trailing comma
-    query += f"""
-    FROM
-        usage_management.history_hourly hh
-    INNER JOIN
-        usage_management.meters m ON hh.meter_id = m.id
-    WHERE
-        hh.date BETWEEN '{start_date}' AND '{end_date}'
-        AND m.organization_id = {organization_id}
-        AND m.id IN ("""
-    
-    # Add meter IDs to the IN clause
-    meter_ids = "', '".join(df['meter_id'])
-    query += f"'{meter_ids}')"
-    
-    query += f"""
-        AND hh.event_code = '{event_code}'
-    GROUP BY
-        hh.date
-    ORDER BY
-        hh.date
-    """
-
-    df = pd.read_sql(query, conn)
-    conn.close()
+    with get_connection() as conn:
+        df = pd.read_sql(query, conn)
     return df
 
 # parent_id 4144
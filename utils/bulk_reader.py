@@ -0,0 +1,72 @@
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+# bytes decoded per block, bounds the memory used by the text in flight
+BLOCK_SIZE = 4 << 20
+
+
+def copy_to_arrow(conn, query, schema, block_size=BLOCK_SIZE):
+    '''Ejecuta COPY (query) TO STDOUT y decodifica el CSV por bloques directamente a columnas Arrow.
+       ---------------------------------------------------------------------------------
+       Parameters
+       conn: conexión psycopg2 (o PooledConnection)
+       query: str
+                  SELECT sin punto y coma final.
+       schema: pa.Schema
+                  Nombres y tipos de las columnas del SELECT, en orden.
+       block_size: int
+                  Tamaño en bytes de cada bloque de texto decodificado.
+       ---------------------------------------------------------------------------------
+       Return
+       table: pa.Table
+                  Una tabla por bloques; las filas nunca pasan por objetos de Python.'''
+    read_fd, write_fd = os.pipe()
+    reader = os.fdopen(read_fd, 'rb')
+    errors = []
+
+    def copy():
+        # psycopg2 pushes the COPY stream into the pipe while pyarrow pulls from the other end
+        try:
+            with os.fdopen(write_fd, 'wb') as writer, conn.cursor() as cursor:
+                cursor.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv)', writer)
+        except BrokenPipeError:
+            pass  # the reader gave up, its own error is raised below
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=copy, daemon=True)
+    thread.start()
+
+    try:
+        if not reader.peek(1):
+            # COPY returned no rows, pyarrow refuses an empty stream
+            batches = []
+        else:
+            stream = pa_csv.open_csv(
+                reader,
+                read_options=pa_csv.ReadOptions(column_names=schema.names, block_size=block_size),
+                # COPY csv quotes values with line breaks, they stay inside the value
+                parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                convert_options=pa_csv.ConvertOptions(column_types=schema, strings_can_be_null=True),
+            )
+            batches = [batch for batch in stream]
+    except Exception:
+        reader.close()
+        thread.join()
+        if errors:
+            raise errors[0]
+        raise
+    reader.close()
+    thread.join()
+    if errors:
+        raise errors[0]
+
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def arrow_to_frame(table):
+    # split_blocks/self_destruct release each Arrow column as soon as pandas owns its copy
+    return table.to_pandas(split_blocks=True, self_destruct=True)
@@ -0,0 +1,98 @@
+import json
+import threading
+from collections import OrderedDict
+
+from utils.derived import derived_nbytes
+
+
+def spec_nbytes(spec):
+    # memory of a cached spec: the DataFrames in datasets (chart_spec leaves them as is) plus the
+    # rest of the spec, estimated by its JSON size
+    datasets = spec.get('datasets', {})
+    size = sum(derived_nbytes(data) if hasattr(data, 'memory_usage') else len(json.dumps(data, default=str))
+               for data in datasets.values())
+    rest = {field: value for field, value in spec.items() if field != 'datasets'}
+    return size + len(json.dumps(rest, default=str))
+
+
+class ChartCache:
+    '''Specs de Vega-Lite ya armados, compartidos por todas las sesiones del proceso.
+
+    Cada rerun de Streamlit vuelve a correr la página entera; con este caché un chart cuyo medidor y
+    filtros no cambiaron cuesta una búsqueda en un dict en vez de armar el chart y serializarlo. Las
+    claves salen de chart_key. Cada spec lleva sus DataFrames, así que el límite es de memoria como en
+    DERIVED_CACHE: si el total estimado (spec_nbytes) supera budget_bytes se descartan los menos
+    usados (LRU).'''
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._specs = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            spec = self._specs.get(key)
+            if spec is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._specs.move_to_end(key)
+            return spec
+
+    def put(self, key, spec):
+        size = spec_nbytes(spec)
+        with self._lock:
+            if key in self._specs:
+                self._nbytes -= self._sizes.pop(key)
+            self._specs[key] = spec
+            self._specs.move_to_end(key)
+            self._sizes[key] = size
+            self._nbytes += size
+            # evict least recently used, never the spec just stored
+            while self._nbytes > self.budget_bytes and len(self._specs) > 1:
+                evicted, _ = self._specs.popitem(last=False)
+                self._nbytes -= self._sizes.pop(evicted)
+                self._evictions += 1
+        return spec
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'specs': len(self._specs),
+                'nbytes': self._nbytes,
+                'budget_bytes': self.budget_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+
+def chart_key(store, chart, meter, session_state, cost=None, params=()):
+    '''Clave de un chart en ChartCache.
+       ---------------------------------------------------------------------------------
+       Parameters
+       store: MeterStore
+                  El dataset sin filtrar (session_state.power_df o energy_df); su fingerprint
+                  identifica los datos, el filtro va aparte en la clave.
+       chart: str
+                  Tipo de chart.
+       meter: str o tuple
+                  Medidor, o los medidores de un chart comparativo.
+       session_state: SessionState
+                  La selección del sidebar: min_date, max_date, days y zero_values.
+       cost: float
+                  Costo de la energía de los charts de costo, None en el resto.
+       params: tuple
+                  Otros controles de la página que cambian el chart (bins, bandas, reducción, ...).
+       ---------------------------------------------------------------------------------
+       Return
+       key: tuple'''
+    return (store.fingerprint, chart, meter, str(session_state.min_date), str(session_state.max_date),
+            tuple(sorted(session_state.days or [])), bool(session_state.zero_values), cost) + tuple(params)
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+from utils.derived import DERIVED_CACHE
+
+# weekday 0-6 (0 = lunes) plus one slice with every day together
+ALL_DAYS = 7
+DAYS = 8
+HOURS = 24
+QUANTILES = (0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95)
+
+
+class HourlyCube:
+    '''Agregados por (medidor, día de la semana, hora) de un MeterStore, en arreglos (medidores, 8, 24).
+
+    El día 7 (ALL_DAYS) junta todos los días de la semana. Celdas sin lecturas tienen count 0 y NaN en
+    el resto. quantiles tiene un eje adelante, en el orden de self.q; whisker_low y whisker_high son
+    el menor y mayor valor dentro de 1.5 IQR de los cuartiles, como los bigotes de mark_boxplot, y los
+    puntos fuera de ellos se guardan aparte (outliers).'''
+
+    def __init__(self, names, count, total, minimum, maximum, q, quantiles, whisker_low, whisker_high,
+                 outlier_cells, outlier_values):
+        self.names = names  # meter name -> position on the first axis
+        self.count = count
+        self.sum = total
+        self.min = minimum
+        self.max = maximum
+        self.q = tuple(q)
+        self.quantiles = quantiles
+        self.whisker_low = whisker_low
+        self.whisker_high = whisker_high
+        # points outside the whiskers, flat cell number (meter, day, hour) and value, sorted by cell
+        self.outlier_cells = outlier_cells
+        self.outlier_values = outlier_values
+
+    @property
+    def nbytes(self):
+        arrays = (self.count, self.sum, self.min, self.max, self.quantiles, self.whisker_low, self.whisker_high,
+                  self.outlier_cells, self.outlier_values)
+        return sum(array.nbytes for array in arrays)
+
+    @property
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.sum / self.count, np.nan)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def quantile(self, q):
+        return self.quantiles[self.q.index(q)]
+
+    def frame(self, name, day=ALL_DAYS):
+        # one row per hour of a meter and day, only the hours with readings
+        meter = self.names[name]
+        frame = pd.DataFrame({
+            'hora': np.arange(HOURS),
+            'count': self.count[meter, day],
+            'sum': self.sum[meter, day],
+            'mean': self.mean[meter, day],
+            'min': self.min[meter, day],
+            'max': self.max[meter, day],
+            'whisker_low': self.whisker_low[meter, day],
+            'whisker_high': self.whisker_high[meter, day],
+        })
+        for q, values in zip(self.q, self.quantiles):
+            frame[f'q{round(q * 100):02d}'] = values[meter, day]
+        return frame[frame['count'] > 0].reset_index(drop=True)
+
+    def outliers(self, name, day=ALL_DAYS):
+        # hora and value of the points outside the whiskers of a meter and day
+        first = (self.names[name] * DAYS + day) * HOURS
+        start, end = np.searchsorted(self.outlier_cells, [first, first + HOURS])
+        return pd.DataFrame({'hora': self.outlier_cells[start:end] - first, 'value': self.outlier_values[start:end]})
+
+    def matrix(self, name, statistic='mean'):
+        # hour x weekday table of one statistic, the layout of the old pivot_table; weekdays or hours
+        # without readings are left out like pivot_table does
+        meter = self.names[name]
+        values = getattr(self, statistic)[meter, :ALL_DAYS].T
+        matrix = pd.DataFrame(values, index=pd.Index(range(HOURS), name='Hour'),
+                              columns=pd.Index(range(ALL_DAYS), name='DayOfWeek'))
+        return matrix.dropna(axis=0, how='all').dropna(axis=1, how='all')
+
+
+def grouped_stats(values, groups, size, q=QUANTILES):
+    '''Estadísticos de values por grupo en una pasada: se ordena por (grupo, valor) y cada grupo queda
+       como un tramo contiguo y ordenado.
+       ---------------------------------------------------------------------------------
+       Parameters
+       values: array
+       groups: array de enteros
+                  Grupo de cada valor, entre 0 y size - 1.
+       size: int
+                  Cantidad de grupos; los que no tienen valores quedan con count 0 y NaN.
+       q: tuple
+                  Cuantiles a calcular (interpolación lineal, como pandas); se agregan 0.25 y 0.75
+                  si faltan, los bigotes los necesitan.
+       ---------------------------------------------------------------------------------
+       Return
+       stats: dict
+                  count, sum, min, max, q, quantiles (len(q), size), whisker_low, whisker_high y los
+                  valores atípicos (fuera de 1.5 IQR) como outlier_groups y outlier_values.'''
+    q = tuple(sorted(set(q) | {0.25, 0.75}))
+    values = np.asarray(values, dtype=np.float64)
+    groups = np.asarray(groups, dtype=np.int64)
+
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+
+    count = np.bincount(groups, minlength=size)
+    total = np.bincount(groups, weights=values, minlength=size)
+    starts = np.zeros(size, dtype=np.int64)
+    np.cumsum(count[:-1], out=starts[1:])
+    filled = count > 0
+
+    def pick(positions):
+        result = np.full(size, np.nan)
+        result[filled] = values[positions[filled]]
+        return result
+
+    quantiles = np.full((len(q), size), np.nan)
+    for i, fraction in enumerate(q):
+        # linear interpolation between the two closest ranks
+        rank = (count[filled] - 1) * fraction
+        low = np.floor(rank).astype(np.int64)
+        high = np.minimum(low + 1, count[filled] - 1)
+        base = starts[filled]
+        quantiles[i, filled] = values[base + low] + (values[base + high] - values[base + low]) * (rank - low)
+
+    # whiskers: the values of the run are sorted, so the ones inside the fences are a contiguous block
+    q1, q3 = quantiles[q.index(0.25)], quantiles[q.index(0.75)]
+    outside = (values < (q1 - 1.5 * (q3 - q1))[groups]) | (values > (q3 + 1.5 * (q3 - q1))[groups])
+    below = np.bincount(groups, weights=outside & (values < q1[groups]), minlength=size).astype(np.int64)
+    above = np.bincount(groups, weights=outside & (values > q3[groups]), minlength=size).astype(np.int64)
+
+    return {
+        'count': count,
+        'sum': np.where(filled, total, np.nan),
+        'min': pick(starts),
+        'max': pick(starts + count - 1),
+        'q': q,
+        'quantiles': quantiles,
+        'whisker_low': pick(starts + below),
+        'whisker_high': pick(starts + count - 1 - above),
+        'outlier_groups': groups[outside],
+        'outlier_values': values[outside],
+    }
+
+
+def build_cube(store, q=QUANTILES):
+    '''Construye el HourlyCube de un MeterStore (normalmente la vista ya filtrada de utils.filters) en
+       una pasada vectorizada de grouped_stats sobre las celdas (medidor, día, hora).'''
+    meters = len(store.meter_ids)
+    shape = (meters, DAYS, HOURS)
+
+    fechas = pd.DatetimeIndex(store.index)
+    hour = fechas.hour.to_numpy()[store.positions]
+    day = fechas.dayofweek.to_numpy()[store.positions]
+    meter = np.repeat(np.arange(meters), np.diff(store.offsets))
+
+    # every reading lands in its weekday cell and in the all-days cell
+    cells = np.concatenate([(meter * DAYS + day) * HOURS + hour, (meter * DAYS + ALL_DAYS) * HOURS + hour])
+    stats = grouped_stats(np.concatenate([store.values, store.values]), cells, meters * DAYS * HOURS, q)
+
+    return HourlyCube(store.names, stats['count'].reshape(shape), stats['sum'].reshape(shape),
+                      stats['min'].reshape(shape), stats['max'].reshape(shape), stats['q'],
+                      stats['quantiles'].reshape((len(stats['q']),) + shape),
+                      stats['whisker_low'].reshape(shape), stats['whisker_high'].reshape(shape),
+                      stats['outlier_groups'], stats['outlier_values'])
+
+
+def get_cube(store):
+    # the cube of a filtered view, in DERIVED_CACHE under the view's fingerprint (dataset plus filter)
+    return DERIVED_CACHE.get_or_build((store.fingerprint, 'cube'), lambda: build_cube(store))
@@ -0,0 +1,194 @@
+import threading
+import time
+
+import psycopg2
+from psycopg2.pool import PoolError
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+class PooledConnection:
+    '''Envoltura de una conexión psycopg2 prestada por un ConnectionPool.
+
+    Se usa igual que la conexión original (cursor(), commit(), pd.read_sql, ...), pero close()
+    la devuelve al pool en lugar de cerrarla. Hay que devolverla también cuando la consulta falla:
+    with pool.getconn() as conn: ... o try/finally con close(). Si se pierde sin cerrarla, el
+    recolector de basura la devuelve, pero hasta entonces ocupa un lugar del pool.'''
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise PoolError('connection already returned to the pool')
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.putconn(self._conn)
+            self._conn = None
+
+    def __del__(self):
+        # safety net for a connection dropped without close(); __dict__ avoids __getattr__ on a
+        # half-built instance
+        if self.__dict__.get('_conn') is not None:
+            try:
+                self.close()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    '''Pool de conexiones Postgres de tamaño acotado y seguro entre hilos.
+
+    Parameters
+    connect_kwargs: dict
+               Argumentos de psycopg2.connect.
+    maxconn: int
+               Número máximo de conexiones abiertas (prestadas + libres).
+    timeout: float
+               Segundos máximos de espera por una conexión libre antes de lanzar PoolTimeout.
+    max_idle: float
+               Una conexión libre por más de estos segundos se valida con SELECT 1 antes de prestarla.'''
+
+    def __init__(self, connect_kwargs, maxconn=8, timeout=10.0, max_idle=60.0):
+        self.connect_kwargs = connect_kwargs
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_idle = max_idle
+
+        self._lock = threading.Condition()
+        self._idle = []  # (connection, last time it was returned)
+        self._in_use = 0
+        self._opened = 0
+
+        # metrics
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._lock:
+            while True:
+                conn = self._take_idle()
+                if conn is not None:
+                    break
+                if self._opened < self.maxconn:
+                    # reserve the slot, the handshake happens outside the lock
+                    self._opened += 1
+                    self._in_use += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f'no connection available after {timeout:.1f} s '
+                                      f'({self._in_use}/{self.maxconn} in use)')
+                self._lock.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = psycopg2.connect(**self.connect_kwargs)
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                    self._in_use -= 1
+                    self._lock.notify()
+                raise
+            with self._lock:
+                self._created += 1
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return PooledConnection(self, conn)
+
+    def putconn(self, conn):
+        healthy = not conn.closed
+        if healthy:
+            try:
+                # leave no transaction open between checkouts
+                conn.rollback()
+            except psycopg2.Error:
+                healthy = False
+
+        with self._lock:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._drop(conn)
+            self._lock.notify()
+
+    def closeall(self):
+        with self._lock:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._drop(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self._opened,
+                'maxconn': self.maxconn,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'utilisation': self._in_use / self.maxconn,
+                'checkouts': self._checkouts,
+                'wait_total_s': self._wait_total,
+                'wait_mean_s': self._wait_total / self._checkouts if self._checkouts else 0.0,
+                'wait_max_s': self._wait_max,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded,
+            }
+
+    def _take_idle(self):
+        # called with the lock held; most recently used first so stale connections age out
+        while self._idle:
+            conn, returned = self._idle.pop()
+            if conn.closed:
+                self._drop(conn)
+                continue
+            if time.monotonic() - returned > self.max_idle and not self._ping(conn):
+                self._drop(conn)
+                continue
+            self._in_use += 1
+            return conn
+        return None
+
+    def _ping(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _drop(self, conn):
+        # called with the lock held
+        self._opened -= 1
+        self._discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
@@ -0,0 +1,86 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# default of DerivedCache.get for a key that isn't cached, None is a valid cached result
+MISSING = object()
+
+
+def derived_nbytes(value):
+    # memory of a cached result: MeterStore and HourlyCube expose nbytes, DataFrames and PNG bytes don't
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return int(value.nbytes)
+
+
+class DerivedCache:
+    '''Resultados derivados de los datasets del registro (vistas filtradas, cubes, histogramas, PNG),
+    compartidos por todas las sesiones del proceso y con su propio presupuesto de memoria.
+
+    Las claves empiezan con el fingerprint del store del que salen, así un resultado no se mezcla con el
+    de otro dataset. Si el total supera budget_bytes se descartan los menos usados (LRU). El resultado
+    se arma fuera del lock: dos sesiones pueden construir el mismo a la vez y queda el último.'''
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._results = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._results:
+                self._misses += 1
+                return default
+            self._hits += 1
+            self._results.move_to_end(key)
+            return self._results[key]
+
+    def put(self, key, value):
+        size = derived_nbytes(value)
+        with self._lock:
+            if key in self._results:
+                self._nbytes -= self._sizes.pop(key)
+            self._results[key] = value
+            self._results.move_to_end(key)
+            self._sizes[key] = size
+            self._nbytes += size
+            # evict least recently used, never the result just stored
+            while self._nbytes > self.budget_bytes and len(self._results) > 1:
+                evicted, _ = self._results.popitem(last=False)
+                self._nbytes -= self._sizes.pop(evicted)
+                self._evictions += 1
+        return value
+
+    def get_or_build(self, key, build):
+        value = self.get(key, default=MISSING)
+        if value is MISSING:
+            value = self.put(key, build())
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'results': len(self._results),
+                'nbytes': self._nbytes,
+                'budget_bytes': self.budget_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+
+# one cache for the whole process, next to the registry's DATASET_CACHE_MB
+DERIVED_CACHE = DerivedCache(int(float(os.getenv("DERIVED_CACHE_MB", 512)) * 2**20))
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+
+def meter_spans(store, names):
+    # (start, end) of every requested meter in the store arrays
+    meters = np.array([store.names[name] for name in names], dtype=np.int64)
+    return store.offsets[meters], store.offsets[meters + 1]
+
+
+def bucket_edges(lengths, buckets):
+    # [start, end) of each bucket of each meter, relative to the meter: shape (meters, buckets + 1)
+    return np.floor(lengths[:, None] * np.arange(buckets + 1)[None, :] / buckets).astype(np.int64)
+
+
+def lttb_indices(x, y, starts, lengths, threshold):
+    '''Largest-Triangle-Three-Buckets para varios medidores a la vez.
+       x, y son los arreglos concatenados; cada medidor es el tramo starts[i]:starts[i] + lengths[i].
+       Devuelve los índices elegidos (sobre x, y) de todos los medidores, en orden. El algoritmo es
+       secuencial por bucket (cada punto depende del elegido en el bucket anterior), así que el ciclo es
+       sobre los threshold - 2 buckets y cada paso resuelve todos los medidores y todos los puntos del
+       bucket con operaciones vectorizadas.'''
+    meters = len(starts)
+    buckets = threshold - 2
+    # first and last points are always kept, the interior is split in `buckets` buckets
+    edges = 1 + bucket_edges(lengths - 2, buckets)
+    width = int((edges[:, 1:] - edges[:, :-1]).max())
+
+    # mean of every bucket, the third vertex of the triangle of the previous bucket
+    cumulative = lambda values: np.concatenate([[0.0], np.cumsum(values)])
+    cx, cy = cumulative(x), cumulative(y)
+    absolute = starts[:, None] + edges
+    counts = np.maximum(edges[:, 1:] - edges[:, :-1], 1)
+    mean_x = (cx[absolute[:, 1:]] - cx[absolute[:, :-1]]) / counts
+    mean_y = (cy[absolute[:, 1:]] - cy[absolute[:, :-1]]) / counts
+    last = starts + lengths - 1
+    # after the last bucket the third vertex is the last point
+    mean_x = np.column_stack([mean_x, x[last]])
+    mean_y = np.column_stack([mean_y, y[last]])
+
+    selected = np.empty((meters, threshold), dtype=np.int64)
+    selected[:, 0] = starts
+    selected[:, -1] = last
+    previous = starts
+    offsets = np.arange(width)
+    rows = np.arange(meters)
+    for bucket in range(buckets):
+        candidates = absolute[:, bucket, None] + offsets[None, :]
+        valid = candidates < absolute[:, bucket + 1, None]
+        candidates = np.where(valid, candidates, absolute[:, bucket, None])
+        ax, ay = x[previous][:, None], y[previous][:, None]
+        bx, by = mean_x[:, bucket + 1][:, None], mean_y[:, bucket + 1][:, None]
+        area = np.abs((ax - bx) * (y[candidates] - ay) - (ax - x[candidates]) * (by - ay))
+        area = np.where(valid, area, -1.0)
+        previous = candidates[rows, np.argmax(area, axis=1)]
+        selected[:, bucket + 1] = previous
+    return selected.ravel()
+
+
+def minmax_indices(y, starts, lengths, buckets):
+    # the lowest and highest point of every bucket of every meter, one sort for all of them
+    meter = np.repeat(np.arange(len(starts)), lengths)
+    local = np.arange(lengths.sum()) - np.repeat(np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    # bucket of every point, floor(local * buckets / length), numbered across meters
+    bucket = local * buckets // lengths[meter] + meter * buckets
+    positions = np.repeat(starts, lengths) + local
+    order = np.lexsort((y[positions], bucket))
+    bucket_sorted = bucket[order]
+    first = np.flatnonzero(np.r_[True, bucket_sorted[1:] != bucket_sorted[:-1]])
+    last = np.r_[first[1:] - 1, len(order) - 1]
+    return np.unique(positions[np.concatenate([order[first], order[last]])])
+
+
+def downsample(store, names, width=900, method='lttb'):
+    '''Series de los medidores names reducidas a unos width puntos cada una, en formato largo
+       (fecha, Medidor, value) listo para un line chart de width píxeles.
+       ---------------------------------------------------------------------------------
+       Parameters
+       store: MeterStore
+                  La vista filtrada; al achicar el rango de fechas la vista tiene menos puntos y un
+                  medidor con width puntos o menos se devuelve completo.
+       method: str
+                  'lttb' conserva la forma de la curva, 'minmax' conserva los picos (mínimo y máximo de
+                  cada uno de width / 2 buckets), None no reduce.
+       ---------------------------------------------------------------------------------
+       Return
+       data: DataFrame'''
+    # meters without readings have nothing to draw
+    names = [name for name in names if name in store]
+    if not names:
+        return pd.DataFrame({'fecha': pd.Series(dtype='datetime64[ns]'), 'Medidor': [], 'value': []})
+    starts, ends = meter_spans(store, names)
+    lengths = ends - starts
+    labels = np.asarray(names, dtype=object)
+
+    # meters short enough for the chart go through untouched
+    threshold = width if method == 'lttb' else width // 2
+    reduce = (lengths > width) & (threshold >= 3) if method else np.zeros(len(names), dtype=bool)
+    keep = [np.arange(start, end) for start, end in zip(starts[~reduce], ends[~reduce])]
+    meter = [np.repeat(labels[~reduce], lengths[~reduce])]
+
+    if reduce.any():
+        x = store.index.astype('datetime64[s]').astype(np.float64)[store.positions]
+        y = store.values.astype(np.float64)
+        if method == 'lttb':
+            chosen = lttb_indices(x, y, starts[reduce], lengths[reduce], threshold)
+        else:
+            chosen = minmax_indices(y, starts[reduce], lengths[reduce], threshold)
+        keep.append(chosen)
+        # label every chosen index with the meter whose span it falls in
+        span = np.searchsorted(np.sort(starts[reduce]), chosen, side='right') - 1
+        meter.append(labels[reduce][np.argsort(starts[reduce])][span])
+
+    keep = np.concatenate(keep)
+    return pd.DataFrame({
+        'fecha': store.index[store.positions[keep]],
+        'Medidor': np.concatenate(meter),
+        'value': store.values[keep],
+    })
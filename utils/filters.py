@@ -0,0 +1,68 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from utils.derived import DERIVED_CACHE
+from utils.store import MeterStore
+
+
+def filter_store(store, min_date=None, max_date=None, days=None, zero_values=True):
+    '''Aplica la selección del sidebar a todos los medidores de un MeterStore en una sola pasada.
+       ---------------------------------------------------------------------------------
+       Parameters
+       store: MeterStore
+       min_date, max_date: date
+                  Rango de fechas, se incluyen todas las horas de max_date. None no filtra.
+       days: list
+                  Días de la semana a mantener (0 = lunes). Vacío o None mantiene todos.
+       zero_values: bool
+                  False descarta las lecturas en cero.
+       ---------------------------------------------------------------------------------
+       Return
+       view: MeterStore
+                  Mismo eje de tiempo y mismos nombres; el propio store si no hay nada que filtrar.
+                  El resultado queda en DERIVED_CACHE para ese dataset y esos parámetros.'''
+    key = (None if min_date is None else str(min_date), None if max_date is None else str(max_date),
+           tuple(sorted(days or [])), bool(zero_values))
+    view = DERIVED_CACHE.get_or_build((store.fingerprint, 'filter') + key,
+                                      lambda: build_filtered(store, key, min_date, max_date, days, zero_values))
+    return store if view is None else view
+
+
+def build_filtered(store, key, min_date, max_date, days, zero_values):
+    # the filtered view, or None when nothing is filtered out; the cache doesn't hold (nor count) the
+    # store itself, the registry already does
+    # hours of the common time axis that pass the date and weekday filters, computed once for every meter;
+    # the date range is a contiguous [start, end) of the sorted index
+    start, end = store.window_positions(min_date, max_date)
+    hours = np.zeros(len(store.index), dtype=bool)
+    hours[start:end] = True
+    if days and len(days) < 7:
+        hours[start:end] &= np.isin(pd.DatetimeIndex(store.index[start:end]).dayofweek, days)
+
+    if hours.all() and zero_values:
+        return None
+    keep = hours[store.positions]
+    if not zero_values:
+        keep &= store.values != 0
+    # offsets of every meter in the compressed arrays
+    kept = np.concatenate([[0], np.cumsum(keep)])
+    view = MeterStore(store.index, store.meter_ids, kept[store.offsets], store.positions[keep],
+                      store.values[keep], store.names).freeze()
+    # the view is identified by its dataset and filter, no need to hash its arrays
+    view.__dict__['_fingerprint'] = hashlib.blake2b(repr((store.fingerprint, key)).encode(),
+                                                    digest_size=16).hexdigest()
+    return view
+
+
+def session_view(store, session_state, dates=True, days=True, zeros=True):
+    # the sidebar selection of the current rerun applied to a whole store; flags drop a filter for pages
+    # that never applied it
+    return filter_store(
+        store,
+        min_date=session_state.min_date if dates else None,
+        max_date=session_state.max_date if dates else None,
+        days=session_state.days if days else None,
+        zero_values=session_state.zero_values if zeros else True,
+    )
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+
+class LocationTree:
+    '''Jerarquía de organizations.locations en arreglos de adyacencia padre -> hijos.
+
+    Se construye en una pasada O(n) a partir del DF de get_meters (id, parent_id, name). Los hijos de
+    cada nodo quedan contiguos en children, entre offsets[i] y offsets[i + 1], en el orden del DF.'''
+
+    def __init__(self, locations):
+        self.locations = locations
+        self.ids = locations['id'].to_numpy()
+        self.names = locations['name'].to_numpy()
+        self.position = pd.Index(self.ids)
+
+        # parent position of every node, -1 for roots (and for parents outside the organization)
+        parents = self.position.get_indexer(locations['parent_id'])
+        self.roots = np.flatnonzero(locations['parent_id'].isnull().to_numpy())
+
+        # CSR layout: nodes sorted by parent, stable so siblings keep the DataFrame order
+        has_parent = parents >= 0
+        order = np.argsort(parents[has_parent], kind='stable')
+        self.children = np.flatnonzero(has_parent)[order]
+        self.offsets = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parents[has_parent], minlength=len(self.ids)), out=self.offsets[1:])
+
+    def __contains__(self, location_id):
+        return location_id in self.position
+
+    def child_positions(self, position):
+        return self.children[self.offsets[position]:self.offsets[position + 1]]
+
+    def descendants(self, location_id):
+        # preorder walk of the subtree, O(subtree), the location itself is not included
+        if location_id not in self.position:
+            return []
+        start = self.position.get_loc(location_id)
+        result = []
+        seen = {start}
+        stack = list(self.child_positions(start)[::-1])
+        while stack:
+            position = stack.pop()
+            if position in seen:
+                continue  # a cycle in parent_id
+            seen.add(position)
+            result.append(position)
+            stack.extend(self.child_positions(position)[::-1])
+        return self.ids[np.asarray(result, dtype=np.int64)].tolist()
+
+    def to_nested(self, location_id=None):
+        # same {id: {'name': ..., 'children': {...}}} dict build_hierarchy returns, from the roots or
+        # from the children of location_id
+        ids = self.ids.tolist()
+
+        def node(position):
+            return {'name': self.names[position]}
+
+        if location_id is None:
+            tops = self.roots
+        elif location_id in self.position:
+            tops = self.child_positions(self.position.get_loc(location_id))
+        else:
+            return {}
+
+        hierarchy = {}
+        stack = []
+        for top in tops:
+            hierarchy[ids[top]] = item = node(top)
+            stack.append((top, item))
+        seen = set(tops.tolist())
+        while stack:
+            position, item = stack.pop()
+            children = {}
+            for child in self.child_positions(position):
+                if child in seen:
+                    continue
+                seen.add(child)
+                children[ids[child]] = child_item = node(child)
+                stack.append((child, child_item))
+            if children:
+                item['children'] = children
+        return hierarchy
+
+
+def build_descendants_query(organization_id, location_id):
+    # subtree resolved by Postgres; UNION (not UNION ALL) stops on cycles in parent_id
+    query = f"""
+    WITH RECURSIVE subtree AS (
+        SELECT id
+        FROM organizations.locations
+        WHERE parent_id = {location_id} AND organization_id = {organization_id}
+        UNION
+        SELECT l.id
+        FROM organizations.locations l
+        INNER JOIN subtree s ON l.parent_id = s.id
+        WHERE l.organization_id = {organization_id}
+    )
+    SELECT id FROM subtree;
+    """
+    return query
+
+
+class MeterIndex:
+    '''Índice location_id -> medidores de una organización, construido con una sola consulta.
+
+    Las filas quedan ordenadas por location_id; los medidores de cada ubicación son el rango
+    starts[i]:ends[i] de frame, así una búsqueda no recorre la tabla.'''
+
+    def __init__(self, meters_locations):
+        self.frame = meters_locations.sort_values('location_id', kind='stable').reset_index(drop=True)
+        locations = self.frame['location_id'].to_numpy()
+        self.locations = pd.Index(pd.unique(locations))
+        self.starts = np.searchsorted(locations, self.locations.to_numpy(), side='left')
+        self.ends = np.searchsorted(locations, self.locations.to_numpy(), side='right')
+
+    def lookup(self, location_ids, limit=None):
+        # rows of every requested location, in the order of location_ids, at most limit rows
+        positions = self.locations.get_indexer(location_ids)
+        positions = positions[positions >= 0]
+        if len(positions) == 0:
+            return self.frame.iloc[:0]
+        lengths = self.ends[positions] - self.starts[positions]
+        # expand each [start, end) range without a Python loop
+        offsets = np.repeat(self.starts[positions] - np.cumsum(lengths) + lengths, lengths)
+        rows = offsets + np.arange(lengths.sum())
+        if limit is not None:
+            rows = rows[:limit]
+        return self.frame.iloc[rows].reset_index(drop=True)
+
+
+def build_meters_locations_query(organization_id):
+    # every meter of the organization with its location, the base of MeterIndex
+    query = f"""
+    SELECT
+        ml.location_id,
+        ml.meter_id,
+        m.name AS meter_name
+    FROM
+        usage_management.meters_locations ml
+    JOIN
+        usage_management.meters m ON ml.meter_id = m.id
+    WHERE
+        m.organization_id = {organization_id};
+    """
+    return query
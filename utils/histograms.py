@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from utils.cube import grouped_stats
+from utils.derived import DERIVED_CACHE
+
+# bin strategies offered on the Histograma page
+BIN_STRATEGIES = {
+    'Cantidad fija': 'fixed',
+    'Freedman–Diaconis': 'fd',
+    'Bordes compartidos': 'shared',
+}
+# Freedman–Diaconis on a spiky meter can ask for thousands of bins
+MAX_BINS = 200
+
+
+def bin_edges(store, strategy='fixed', bins=10):
+    '''Bordes de los bins de cada medidor del store.
+       ---------------------------------------------------------------------------------
+       Parameters
+       store: MeterStore
+       strategy: str
+                  'fixed': bins bins entre el mínimo y el máximo de cada medidor (como numpy.histogram).
+                  'fd': ancho de Freedman–Diaconis de cada medidor, 2 IQR / n^(1/3), hasta MAX_BINS.
+                  'shared': bins bins entre el mínimo y el máximo de todos los medidores, los mismos
+                  bordes para todos.
+       bins: int
+       ---------------------------------------------------------------------------------
+       Return
+       starts, widths, counts: arrays
+                  Por medidor: borde izquierdo, ancho y cantidad de bins (0 si no tiene lecturas).'''
+    meters = len(store.meter_ids)
+    stats = grouped_stats(store.values, np.repeat(np.arange(meters), np.diff(store.offsets)), meters, q=())
+    has_data = stats['count'] > 0
+    low, high = stats['min'], stats['max']
+
+    if strategy == 'shared':
+        low = np.full(meters, np.nanmin(low) if has_data.any() else 0.0)
+        high = np.full(meters, np.nanmax(high) if has_data.any() else 1.0)
+    counts = np.where(has_data, bins, 0)
+
+    if strategy == 'fd':
+        iqr = stats['quantiles'][stats['q'].index(0.75)] - stats['quantiles'][stats['q'].index(0.25)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            width = 2 * iqr / np.cbrt(stats['count'])
+            fd_counts = np.ceil((high - low) / width)
+        # constant or tiny meters fall back to a single bin
+        fd_counts = np.where(np.isfinite(fd_counts) & (fd_counts >= 1), fd_counts, 1)
+        counts = np.where(has_data, np.minimum(fd_counts, MAX_BINS), 0).astype(np.int64)
+
+    # numpy.histogram widens an empty range to +-0.5
+    flat = high == low
+    low, high = np.where(flat, low - 0.5, low), np.where(flat, high + 0.5, high)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        widths = (high - low) / np.maximum(counts, 1)
+    return low, widths, counts.astype(np.int64)
+
+
+def build_histograms(store, strategy='fixed', bins=10):
+    '''Histogramas de todos los medidores del store en una pasada: cada lectura va a su bin con
+       aritmética vectorizada y un solo bincount, en vez de un numpy.histogram por medidor. Mismos bins
+       que numpy.histogram (semiabiertos, el último incluye el máximo).
+       Devuelve un DF largo con medidor, inicio, fin, lecturas y frecuencia (fracción del medidor).'''
+    meters = len(store.meter_ids)
+    low, widths, counts = bin_edges(store, strategy, bins)
+    first_bin = np.zeros(meters + 1, dtype=np.int64)
+    np.cumsum(counts, out=first_bin[1:])
+
+    meter = np.repeat(np.arange(meters), np.diff(store.offsets))
+    values = store.values.astype(np.float64)
+    position = np.floor((values - low[meter]) / widths[meter]).astype(np.int64)
+    position = np.clip(position, 0, np.maximum(counts[meter] - 1, 0))
+    frequencies = np.bincount(first_bin[meter] + position, minlength=first_bin[-1])
+
+    bin_meter = np.repeat(np.arange(meters), counts)
+    bin_number = np.arange(first_bin[-1]) - first_bin[bin_meter]
+    readings = np.diff(store.offsets)[bin_meter]
+    names = np.empty(meters, dtype=object)
+    for name, position in store.names.items():
+        names[position] = name
+
+    inicio = low[bin_meter] + bin_number * widths[bin_meter]
+    return pd.DataFrame({
+        'medidor': names[bin_meter],
+        'inicio': inicio,
+        'fin': inicio + widths[bin_meter],
+        'lecturas': frequencies,
+        'frecuencia': frequencies / np.maximum(readings, 1),
+    })
+
+
+def get_histograms(store, strategy='fixed', bins=10):
+    # in DERIVED_CACHE like the cube, so it's cached on the dataset, the sidebar selection and the strategy
+    return DERIVED_CACHE.get_or_build((store.fingerprint, 'histograms', strategy, int(bins)),
+                                      lambda: build_histograms(store, strategy, bins))
@@ -0,0 +1,161 @@
+import os
+import threading
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# long format stored in every partition, same columns as ETL.HISTORY_SCHEMA
+SCHEMA = pa.schema([
+    ('fecha', pa.timestamp('us')),
+    ('meter_id', pa.string()),
+    ('event_code', pa.string()),
+    ('value', pa.float64()),
+])
+
+WATERMARK_SCHEMA = pa.schema([
+    ('meter_id', pa.string()),
+    ('event_code', pa.string()),
+    ('covered_from', pa.timestamp('us')),
+    ('watermark', pa.timestamp('us')),
+])
+
+KEY = ['fecha', 'meter_id', 'event_code']
+
+# one lock per organization, sessions of the same process never write the same partition at once
+_locks = defaultdict(threading.Lock)
+
+
+def organization_dir(cache_dir, organization_id):
+    return os.path.join(cache_dir, f'org={organization_id}')
+
+
+def month_path(cache_dir, organization_id, month):
+    return os.path.join(organization_dir(cache_dir, organization_id), f'month={month}.parquet')
+
+
+def load_history(cache_dir, organization_id, meter_ids, start_date, end_date, event_codes, fetch,
+                 lookback=pd.Timedelta(hours=48)):
+    '''Historia horaria en formato largo servida desde el cache local, pidiendo a la base solo lo nuevo.
+       ---------------------------------------------------------------------------------
+       Parameters
+       cache_dir: str
+                  Raíz del cache, una carpeta org=<id> con un Parquet por mes.
+       meter_ids: list
+                  Medidores pedidos.
+       start_date, end_date: datetime
+                  Ventana pedida, inclusiva como el BETWEEN de ETL.build_long_query.
+       event_codes: list
+                  Variables pedidas (act_pwr, act_ene, ...).
+       fetch: callable
+                  fetch(meter_ids, start_date, end_date) -> DF largo (fecha, meter_id, event_code, value).
+       lookback: Timedelta
+                  Cuánto antes de la marca de agua se vuelve a pedir para recoger datos tardíos.
+       ---------------------------------------------------------------------------------
+       Return
+       long_df: DF
+                  Lecturas de la ventana pedida, mismas columnas que fetch.'''
+    start_date = pd.Timestamp(start_date)
+    end_date = pd.Timestamp(end_date)
+    meter_ids = list(dict.fromkeys(meter_ids))
+
+    with _locks[(cache_dir, organization_id)]:
+        watermarks = read_watermarks(cache_dir, organization_id)
+        cold, delta_from = plan_refresh(watermarks, meter_ids, event_codes, start_date, lookback)
+
+        fetched = []
+        # meters never seen (or seen from a later date) need the whole window once
+        if cold:
+            fetched.append((cold, start_date, fetch(cold, start_date, end_date)))
+        # every other meter only needs what arrived after its high-water mark
+        warm = [meter_id for meter_id in meter_ids if meter_id not in cold]
+        if warm and delta_from <= end_date:
+            fetched.append((warm, delta_from, fetch(warm, delta_from, end_date)))
+
+        for ids, since, rows in fetched:
+            merge_rows(cache_dir, organization_id, rows)
+            watermarks = advance_watermarks(watermarks, ids, event_codes, since, end_date, rows)
+        if fetched:
+            write_watermarks(cache_dir, organization_id, watermarks)
+
+        return read_window(cache_dir, organization_id, meter_ids, start_date, end_date, event_codes)
+
+
+def plan_refresh(watermarks, meter_ids, event_codes, start_date, lookback):
+    # cold meters: some requested variable is not cached back to start_date
+    wanted = pd.MultiIndex.from_product([meter_ids, event_codes], names=['meter_id', 'event_code'])
+    known = watermarks.set_index(['meter_id', 'event_code']).reindex(wanted)
+    missing = known['covered_from'].isna() | (known['covered_from'] > start_date)
+    cold = known.index[missing].get_level_values('meter_id').unique().tolist()
+
+    warm = known[~known.index.get_level_values('meter_id').isin(cold)]
+    if warm.empty:
+        return cold, pd.NaT
+    return cold, max(warm['watermark'].min() - lookback, start_date)
+
+
+def advance_watermarks(watermarks, meter_ids, event_codes, since, end_date, rows):
+    # the high-water mark is the newest reading seen, or the end of the consulted range when there is none
+    index = pd.MultiIndex.from_product([meter_ids, event_codes], names=['meter_id', 'event_code'])
+    newest = rows.groupby(['meter_id', 'event_code'])['fecha'].max().reindex(index)
+    update = pd.DataFrame({'covered_from': since, 'watermark': newest.fillna(end_date)}, index=index)
+
+    watermarks = watermarks.set_index(['meter_id', 'event_code'])
+    previous = watermarks.reindex(index)
+    update['covered_from'] = previous['covered_from'].where(previous['covered_from'] < since, since)
+    update['watermark'] = np.maximum(update['watermark'], previous['watermark'].fillna(update['watermark']))
+    watermarks = pd.concat([watermarks.drop(index, errors='ignore'), update])
+    return watermarks.reset_index()
+
+
+def merge_rows(cache_dir, organization_id, rows):
+    # upsert the new rows into their monthly partitions, later fetches win on (fecha, meter_id, event_code)
+    if rows.empty:
+        return
+    months = rows['fecha'].to_numpy().astype('datetime64[M]').astype(str)
+    for month, part in rows.groupby(months, sort=False):
+        path = month_path(cache_dir, organization_id, month)
+        if os.path.exists(path):
+            part = pd.concat([pq.read_table(path).to_pandas(), part], ignore_index=True)
+            part = part.drop_duplicates(subset=KEY, keep='last')
+        write_atomic(pa.Table.from_pandas(part[SCHEMA.names], schema=SCHEMA, preserve_index=False), path)
+
+
+def read_window(cache_dir, organization_id, meter_ids, start_date, end_date, event_codes):
+    months = pd.period_range(start_date, end_date, freq='M').astype(str)
+    paths = [month_path(cache_dir, organization_id, month) for month in months]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return SCHEMA.empty_table().to_pandas()
+
+    filters = [
+        ('fecha', '>=', start_date.to_datetime64()),
+        ('fecha', '<=', end_date.to_datetime64()),
+        ('meter_id', 'in', list(meter_ids)),
+        ('event_code', 'in', list(event_codes)),
+    ]
+    tables = [pq.read_table(path, filters=filters, schema=SCHEMA) for path in paths]
+    return pa.concat_tables(tables).to_pandas(split_blocks=True, self_destruct=True)
+
+
+def read_watermarks(cache_dir, organization_id):
+    path = os.path.join(organization_dir(cache_dir, organization_id), 'watermarks.parquet')
+    if not os.path.exists(path):
+        return WATERMARK_SCHEMA.empty_table().to_pandas()
+    return pq.read_table(path).to_pandas()
+
+
+def write_watermarks(cache_dir, organization_id, watermarks):
+    path = os.path.join(organization_dir(cache_dir, organization_id), 'watermarks.parquet')
+    table = pa.Table.from_pandas(watermarks[WATERMARK_SCHEMA.names], schema=WATERMARK_SCHEMA, preserve_index=False)
+    write_atomic(table, path)
+
+
+def write_atomic(table, path):
+    # readers never see a half written partition
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
@@ -0,0 +1,111 @@
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# func receives the results of its dependencies as keyword arguments named after them
+Step = namedtuple('Step', ['func', 'deps', 'timeout'], defaults=[(), None])
+
+
+class StepSkipped(Exception):
+    pass
+
+
+def run_steps(steps, max_workers=4, initializer=None):
+    '''Ejecuta un grafo de pasos dependientes en un pool de hilos.
+       ---------------------------------------------------------------------------------
+       Parameters
+       steps: dict
+                  nombre -> Step(func, deps, timeout). Un paso arranca apenas terminan sus dependencias.
+       max_workers: int
+                  Hilos simultáneos.
+       initializer: callable
+                  Se ejecuta al iniciar cada hilo (p. ej. para adjuntar el contexto de Streamlit).
+       ---------------------------------------------------------------------------------
+       Return
+       report: dict
+                  results, errors y timings (inicio, fin en segundos) por paso, critical_path con los
+                  pasos que fijaron el tiempo total, critical_time y wall_time.'''
+    results, errors, timings = {}, {}, {}
+    pending = dict(steps)
+    running = {}
+    origin = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max_workers, initializer=initializer)
+
+    def now():
+        return time.perf_counter() - origin
+
+    try:
+        while pending or running:
+            # launch every step whose dependencies finished, skip the ones whose dependencies failed;
+            # a skip can fail a step declared earlier, so repeat until a pass changes nothing
+            progress = True
+            while progress:
+                progress = False
+                for name, step in list(pending.items()):
+                    failed = [dep for dep in step.deps if dep in errors]
+                    if failed:
+                        errors[name] = StepSkipped(f'dependency {failed[0]} failed')
+                        del pending[name]
+                        progress = True
+                    elif all(dep in results for dep in step.deps):
+                        kwargs = {dep: results[dep] for dep in step.deps}
+                        timings[name] = (now(), None)
+                        running[executor.submit(step.func, **kwargs)] = name
+                        del pending[name]
+
+            if not running:
+                # what's left can never start (unknown dependency or a cycle)
+                for name, step in pending.items():
+                    missing = [dep for dep in step.deps if dep not in results]
+                    errors[name] = StepSkipped(f'dependency {missing[0]} never finished')
+                pending.clear()
+                break
+
+            deadlines = [timings[name][0] + steps[name].timeout for name in running.values()
+                         if steps[name].timeout is not None]
+            wait_for = max(min(deadlines) - now(), 0) if deadlines else None
+            done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = running.pop(future)
+                timings[name] = (timings[name][0], now())
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    errors[name] = e
+
+            # abandon steps past their timeout, the thread finishes in the background and is ignored
+            for future, name in list(running.items()):
+                timeout = steps[name].timeout
+                if timeout is not None and now() - timings[name][0] >= timeout:
+                    del running[future]
+                    timings[name] = (timings[name][0], now())
+                    errors[name] = TimeoutError(f'step {name} exceeded {timeout} s')
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    critical_path = get_critical_path(steps, timings)
+    return {
+        'results': results,
+        'errors': errors,
+        'timings': timings,
+        'critical_path': critical_path,
+        'critical_time': sum(timings[name][1] - timings[name][0] for name in critical_path),
+        'wall_time': now(),
+    }
+
+
+def get_critical_path(steps, timings):
+    # walk back from the last step to finish through the dependency that finished last
+    finished = {name: span for name, span in timings.items() if span[1] is not None}
+    if not finished:
+        return []
+    name = max(finished, key=lambda step: finished[step][1])
+    path = [name]
+    while True:
+        deps = [dep for dep in steps[name].deps if dep in finished]
+        if not deps:
+            break
+        name = max(deps, key=lambda dep: finished[dep][1])
+        path.append(name)
+    return path[::-1]
@@ -1,48 +1,25 @@
 import pandas as pd
 import altair as alt
 
-from utils.ETL import range_selector
+from utils.plots.boxplot import BOX_COLUMNS, box_layers
 
 # ----------- hourly boxplot COST -----------
-def plot_hourly_boxplot_cost_altair(data, column, session_state=None):
-    # Convert 'fecha' column to datetime format
-    data['fecha'] = pd.to_datetime(data['fecha'])
-    
-    # Filter out rows where the specified column has NaN values
-    data = data.dropna(subset=[column])
-
-    if session_state and not session_state.zero_values:
-        # Erase 0 values from the data
-        data = data[data[column] != 0]
-
-    # filter the data to just get the date range selected
-    data = range_selector(data, min_date=session_state.min_date, max_date=session_state.max_date)
+def plot_hourly_boxplot_cost_altair(cube, column, session_state=None):
+    # hourly statistics of the meter from the aggregate cube of the filtered data (utils.cube)
+    stats = cube.frame(column)
 
-    # filter the data to just get the days of the week selected
-    if session_state.days:
-        data = data[data['fecha'].dt.dayofweek.isin(session_state.days)]
-
-    if data.empty:
+    if stats.empty:
         print(f"No valid data for column '{column}'.")
         return None
     
-    # Multiply the demand by the cost of the demand
+    # Multiply the demand by the cost of the demand, the order statistics scale with it
     cost = session_state.cost  # COP/kWh
-    data[column] = data[column] * cost
-    data['fecha'] = data['fecha'].dt.strftime('%Y-%m-%dT%H:%M:%S')       
+    stats[BOX_COLUMNS] = stats[BOX_COLUMNS] * cost
+    outliers = cube.outliers(column)
+    outliers['value'] = outliers['value'] * cost
     # Create a boxplot using Altair with x axis as the hour of the day on 24 h format and
-    # y axis as the demand that is on the data[column]
-    boxplot = alt.Chart(data).mark_boxplot(
-        size = 23, 
-        box={'stroke': 'black'},  # Could have used MarkConfig instead
-        median=alt.MarkConfig(stroke='red'),  # Could have used a dict instead
-    ).encode(
-        x=alt.X('hours(fecha):N', title='Hora', axis=alt.Axis(format='%H')),
-        y=alt.Y(f'{column}:Q', title='Costo [$/kWh]', axis=alt.Axis(format='$,.2f'),sort='ascending').scale(zero=False),
-        color=alt.value('#2d667a'),  # Set the color of the bars
-        opacity=alt.value(0.9), # set the opacity of the bars
-        tooltip=[alt.Tooltip('hours(fecha):N', title='Hora')]  # Customize the tooltip
-    )
+    # y axis as the cost of the demand
+    boxplot = box_layers(stats, 'hora', x_title='Hora', y_title='Costo [$/kWh]', outliers=outliers, y_format='$,.2f')
 
     chart = (boxplot).properties(
         width=600,  # Set the width of the chart
@@ -1,47 +1,22 @@
 import pandas as pd
 import altair as alt
 
-from utils.ETL import range_selector
+from utils.plots.boxplot import box_layers
 
-# ----------- hourly boxplot -----------
-def plot_hourly_boxplot_altair(data, column, session_state=None):
-    # Convert 'fecha' column to datetime format
-    data['fecha'] = pd.to_datetime(data['fecha'])
-    
-    # Filter out rows where the specified column has NaN values
-    data = data.dropna(subset=[column])
-
-    if session_state and not session_state.zero_values:
-        # Erase 0 values from the data
-        data = data[data[column] != 0]
-
-    # filter the data to just get the date range selected
-    data = range_selector(data, min_date=session_state.min_date, max_date=session_state.max_date)
 
-    # filter the data to just get the days of the week selected
-    if session_state.days:
-        data = data[data['fecha'].dt.dayofweek.isin(session_state.days)]
+# ----------- hourly boxplot -----------
+def plot_hourly_boxplot_altair(cube, column, session_state=None):
+    # hourly statistics of the meter from the aggregate cube of the filtered data (utils.cube)
+    stats = cube.frame(column)
 
-    if data.empty:
+    if stats.empty:
         print(f"No valid data for column '{column}'.")
         return None
 
     # Create a boxplot using Altair with x axis as the hour of the day on 24 h format and
     # y axis as the demand that is on the data[column]
-    data['fecha'] = data['fecha'].dt.strftime('%Y-%m-%dT%H:%M:%S') 
-          
-    boxplot = alt.Chart(data).mark_boxplot(
-        size = 23, 
-        box={'stroke': 'black'},  # Could have used MarkConfig instead
-        median=alt.MarkConfig(stroke='red'),  # Could have used a dict instead
-    ).encode(
-        x=alt.X('hours(fecha):N', title='Hora', axis=alt.Axis(format='%H'), sort='ascending'),
-        y=alt.Y(f'{column}:Q', title='Demanda [kW]').scale(zero=False),
-        strokeWidth=alt.value(1),  # Set the width of the boxplot
-        color=alt.value('#2d667a'),  # Set the color of the bars
-        opacity=alt.value(0.9),  # Set the opacity of the bars           
-        tooltip=[alt.Tooltip('hours(fecha):N', title='Hora')]  # Customize the tooltip
-    )
+    boxplot = box_layers(stats, 'hora', x_title='Hora', y_title='Demanda [kW]', outliers=cube.outliers(column))
+
     chart = (boxplot).properties(
         width=600,  # Set the width of the chart
         height=400,  # Set the height of the chart
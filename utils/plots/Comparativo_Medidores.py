@@ -4,4 +4,50 @@ import pandas as pd
 import altair as alt
 from matplotlib import ticker
 from matplotlib.colors import LinearSegmentedColormap
-from utils.ETL import range_selector
\ No newline at end of file
+from utils.downsample import downsample
+from utils.plots.temporal import epoch_ms, time_tooltip, time_x
+
+# downsampling options of the comparison pages
+DOWNSAMPLING = {
+    'LTTB': 'lttb',
+    'Mínimo/máximo': 'minmax',
+    'Sin reducir': None,
+}
+
+
+# ------------------- Meters comparison -------------------
+def plot_meters_comparison(view, meters, session_state=None, method='lttb', width=900):
+    # the filtered series of every selected meter reduced to about one point per pixel in one vectorized
+    # pass; narrowing the date range gives the view fewer points and brings back full resolution
+    data = downsample(view, meters, width=width, method=method)
+
+    if data.empty:
+        print(f"No valid data for meter_select '{meters}'.")
+
+    # fecha goes as epoch ms, no string per row
+    data = epoch_ms(data)
+
+    legend_graph= alt.Chart(data).mark_line().encode(
+    x=time_x('fecha', title='Fecha', format='%d/%m/%Y-%H:%M'),  # Specify date format for axis
+    y=alt.Y('value:Q', title='Demanda [kW]').scale(zero=False),
+    color='Medidor:N',
+    tooltip=[time_tooltip('fecha'), 'value:Q', 'Medidor:N']
+    ).properties(
+        width=width,  # Set the width of the chart
+        height=450,  # Set the height of the chart
+        title=f'Comparativo Medidores'  # Set the title of the chart
+    ).configure_axis(
+        labelFontSize=12,  # Set the font size of axis labels
+        titleFontSize=14,  # Set the font size of axis titles
+        grid=True,
+        gridColor='#4C72B0',  # Set the color of grid lines
+        labelColor='black', # color of labels of x-axis and y-axis is black        
+        titleFontWeight='bold', # x-axis and y-axis titles are bold
+        titleColor='black', # color of x-axis and y-axis titles is black
+        gridOpacity=0.2  # Set the opacity of grid lines
+    ).configure_view(
+        strokeWidth=0,  # Remove the border of the chart
+        fill='#FFFFFF'  # Set background color to white
+    ).interactive()
+
+    return legend_graph
@@ -1,20 +1,13 @@
 import pandas as pd
 import altair as alt
 
-from utils.ETL import range_selector
+from utils.plots.temporal import epoch_ms, time_x
 
 
 
 # -------------------- Daily energy consumption -------------------
 def plot_diary_energy_altair(data, column, session_state=None):
-    # delete NaN values of data[column]
-    data = data.dropna(subset=[column])
-
-    # Convert 'fecha' column to datetime if it's not already
-    data['fecha'] = pd.to_datetime(data['fecha'])
-    # ensure fecha is ISO 8601 format
-
-    data = range_selector(data, min_date=session_state.min_date, max_date=session_state.max_date)
+    # data arrives already filtered by utils.filters (date range only)
 
     # Set 'fecha' as the index
     data = data.set_index('fecha')
@@ -29,10 +22,11 @@ def plot_diary_energy_altair(data, column, session_state=None):
  
     # Calculate median of the selected period
     median_value = daily_data[column].median()
-    daily_data['fecha'] = daily_data['fecha'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    # fecha goes as epoch ms, no string per row
+    daily_data = epoch_ms(daily_data)
     # Create an Altair chart
     bars = alt.Chart(daily_data).mark_bar().encode(
-        x='fecha:T',  # Treat 'fecha' as a temporal field
+        x=time_x('fecha', title='fecha'),  # Treat 'fecha' as a temporal field
         y=alt.Y(column, title=f'Consumo [{column}] [kWh]', axis=alt.Axis(titleFontSize=14)).scale(zero=False),  # Set the y-axis title
         color=alt.value('#2d667a'),  # Set the color of the bars
         opacity=alt.value(0.9),  # Set the opacity of the bars
@@ -1,17 +1,13 @@
-import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 
+from matplotlib.figure import Figure
+
+
 # ------------------- Monthly energy consumption -------------------
-def plot_monthly_energy(data, column, session_state=None):
-    # Set darkgrid style
-    sns.set_style("white")
-    
-    # Extract year and month from the timestamp
-    data['YearMonth'] = data['fecha'].dt.to_period('M')
-    
-    # Group by month and sum the energy consumption
-    monthly_data = data.groupby('YearMonth')[column].sum()
+def monthly_energy_data(data, column, session_state=None):
+    # Group by month (year and month of the timestamp) and sum the energy consumption
+    monthly_data = data.groupby(data['fecha'].dt.to_period('M'))[column].sum()
 
     if session_state and not session_state.zero_values:
         # Erase 0 values from the data
@@ -20,17 +16,22 @@ def plot_monthly_energy(data, column, session_state=None):
     if monthly_data.empty:
         print(f"No valid data for column '{column}'.")
         return None
-    
-    # Get the last 4 complete months including the current month
-    last_4_months = monthly_data.index[-4:]
-    
-    # Convert PeriodIndex to strings for plotting
-    last_4_months_str = last_4_months.astype(str)
-    
-    # Create a bar plot for the last 4 complete months
-    fig, ax = plt.subplots()
-
-    ax.bar(last_4_months_str, monthly_data[last_4_months_str], color='#4C72B0', alpha=0.57)
+
+    # Get the last 4 complete months including the current month,
+    # PeriodIndex converted to strings for plotting
+    last_4_months = monthly_data.iloc[-4:]
+    last_4_months.index = last_4_months.index.astype(str)
+    return last_4_months
+
+
+def monthly_energy_figure(monthly_data, column):
+    # object oriented figure, no pyplot state, so it can be drawn in a worker process (utils.plots.png)
+    # Create a bar plot for the last 4 complete months, white style only for this figure
+    with sns.axes_style("white"):
+        fig = Figure()
+        ax = fig.subplots()
+
+    ax.bar(monthly_data.index, monthly_data.to_numpy(), color='#4C72B0', alpha=0.57)
 
     # Set the title of the plot
     ax.set_title(f'Consumo mensual {column}')
@@ -42,19 +43,21 @@ def plot_monthly_energy(data, column, session_state=None):
     ax.set_ylabel('Consumo [kWh]')
 
     # Rotate the x-axis labels for better readability
-    plt.xticks(rotation=45)
+    ax.tick_params(axis='x', labelrotation=45)
 
     # Show the values on the bars
-    # Inside the loop for annotations
     for p in ax.patches:
         value_formatted = '{:,.2f}'.format(p.get_height()).replace(',', ' ').replace('.', ',')  # Format the number
         ax.annotate(value_formatted, (p.get_x() + p.get_width() / 2., p.get_height()),
                     ha='center', va='center', fontsize=10, color='black', xytext=(0, 5),
                     textcoords='offset points')
-    # erase column YearMonth
-    data.drop(columns=['YearMonth'], inplace=True)
-    # Close the plot
-    plt.close()
 
     # return the figure object
     return fig
+
+
+def plot_monthly_energy(data, column, session_state=None):
+    monthly_data = monthly_energy_data(data, column, session_state)
+    if monthly_data is None:
+        return None
+    return monthly_energy_figure(monthly_data, column)
@@ -1,39 +1,32 @@
 import pandas as pd
 import altair as alt
 
-from utils.ETL import range_selector
 
 # ----------- Hisotgram Altair-----------
-def plot_histogram_altair(data, column, session_state=None):
-    # Convert 'fecha' column to datetime format
-    data['fecha'] = pd.to_datetime(data['fecha'])
-        
-    # erase Nan values on data[column]
-    data = data.dropna(subset=[column])
-    
-    if not session_state.zero_values:
-        # Erase 0 values from the data
-        data = data[data[column] != 0]
+def plot_histogram_altair(histograms, column, session_state=None):
+    # bins of the meter already counted server-side (utils.histograms), only edges and frequencies
+    # reach the browser
+    data = histograms[histograms['medidor'] == column]
 
-    # filter the data to just get the date range selected
-    data = range_selector(data, min_date=session_state.min_date, max_date=session_state.max_date)
-
-    # filter the data to just get the days of the week selected
-    if session_state.days:
-        data = data[data['fecha'].dt.dayofweek.isin(session_state.days)]
+    if data.empty:
+        print(f"No valid data for column '{column}'.")
+        return None
 
     # Create a histogram using Altair
-    chart = alt.Chart(data).transform_joinaggregate(
-            total='count(*)'
-        ).transform_calculate(
-            pct='1 / datum.total'
-        ).mark_bar().encode(
-        x=alt.X(f"{column}:Q", bin=alt.Bin(maxbins=10), title='Demanda [kW]').scale(zero=False),
-        y=alt.Y('sum(pct):Q', stack=None, axis=alt.Axis(format='%'), title='Frecuencia'),
+    chart = alt.Chart(data).mark_bar().encode(
+        x=alt.X('inicio:Q', title='Demanda [kW]').scale(zero=False),
+        x2='fin:Q',
+        y=alt.Y('frecuencia:Q', stack=None, axis=alt.Axis(format='%'), title='Frecuencia'),
         color=alt.value('#2D667A'),  # Set the color of the bars
         opacity=alt.value(0.9),  # Set the opacity of the bars 
         stroke = alt.value('black'),  # Set the color of the boxplot
         strokeWidth=alt.value(1),  # Set the width of the boxplot  
+        tooltip=[
+            alt.Tooltip('inicio:Q', title='Desde', format=',.2f'),
+            alt.Tooltip('fin:Q', title='Hasta', format=',.2f'),
+            alt.Tooltip('frecuencia:Q', title='Frecuencia', format='.1%'),
+            alt.Tooltip('lecturas:Q', title='Lecturas'),
+        ],
     ).properties(
         width=600,  # Set the width of the chart
         height=450,  # Set the height of the chart
@@ -1,38 +1,15 @@
-import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 
 from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.figure import Figure
 
 
 # ------------------- Weekly energy consumption -------------------
-def plot_hourly_matrix(data, column, session_state=None):
-    # Define the custom colormap
-    colors = ["#00B0F0", "#141A2F"]
-    cmap = LinearSegmentedColormap.from_list("custom", colors)
-
-    data = data[['fecha', column]]
-    # Convert 'fecha' column to datetime format
-    data['fecha'] = pd.to_datetime(data['fecha'])
-        
-    # erase Nan values on data[column]
-    data = data.dropna(subset=[column])
-    
-    if not session_state.zero_values:
-        # Erase 0 values from the data
-        data = data[data[column] != 0]
-
-    # filter the data to just get the date range selected
-    # data = range_selector(data, min_date=session_state.min_date, max_date=session_state.max_date)
-
-    # filter the data to just get the days of the week selected
-    if session_state.days:
-        data = data[data['fecha'].dt.dayofweek.isin(session_state.days)]
-
-    data['DayOfWeek'] = data['fecha'].dt.dayofweek
-    data['Hour'] = data['fecha'].dt.hour
-    # Pivot the data to have rows as hour of the day and columns as day of the week
-    heatmap_data = data.pivot_table(index='Hour', columns='DayOfWeek', values=f'{column}', aggfunc='mean')
+def hourly_matrix_data(cube, column, session_state=None):
+    # mean by hour of the day (rows) and day of the week (columns) from the aggregate cube of the
+    # filtered data (utils.cube), same table the pivot_table gave
+    heatmap_data = cube.matrix(column, 'mean')
 
     if session_state and not session_state.zero_values:
         # Erase 0 values from the data
@@ -41,8 +18,17 @@ def plot_hourly_matrix(data, column, session_state=None):
     if heatmap_data.empty:
         print(f"No valid data for column '{column}'.")
         return None
-    
-    fig, ax = plt.subplots()
+    return heatmap_data
+
+
+def hourly_matrix_figure(heatmap_data, column):
+    # object oriented figure, no pyplot state, so it can be drawn in a worker process (utils.plots.png)
+    # Define the custom colormap
+    colors = ["#00B0F0", "#141A2F"]
+    cmap = LinearSegmentedColormap.from_list("custom", colors)
+
+    fig = Figure()
+    ax = fig.subplots()
     sns.heatmap(heatmap_data, cmap=cmap, ax=ax)  # Use the custom colormap
     ax.set_title(f'Consumo semanal y horario {column} [kWh]', fontsize=16)
     ax.set_xlabel('Día de la semana', fontsize=14)
@@ -58,9 +44,13 @@ def plot_hourly_matrix(data, column, session_state=None):
     ax.set_xticks(range(7))
     ax.set_xticklabels(['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo'])
 
-    plt.tight_layout()
-
-    
-    plt.show()
+    fig.tight_layout()
     # Return the figure object
     return fig
+
+
+def plot_hourly_matrix(cube, column, session_state=None):
+    heatmap_data = hourly_matrix_data(cube, column, session_state)
+    if heatmap_data is None:
+        return None
+    return hourly_matrix_figure(heatmap_data, column)
@@ -1,52 +1,70 @@
 import pandas as pd
 import altair as alt
 
-from utils.ETL import range_selector
 
-# ------------------- Power Profile Plot -------------------
-def plot_power_profile_daily_altair(data, column, session_state=None):
-    # Convert 'fecha' column to datetime format
-    data['fecha'] = pd.to_datetime(data['fecha'])
-    
-    # Filter out rows where the specified column has NaN values
-    data = data.dropna(subset=[column])
+# percentile bands the page can show, all of them are quantiles of utils.cube.QUANTILES
+PROFILE_BANDS = {
+    'P5–P95': (0.05, 0.95),
+    'P10–P90': (0.1, 0.9),
+    'P25–P75': (0.25, 0.75),
+}
+
 
-    if session_state and not session_state.zero_values:
-        # Erase 0 values from the data
-        data = data[data[column] != 0]
+def sample_days(data, column, n):
+    # n days spread over the range of daily consumption (lowest, ..., highest), their hourly readings
+    if n <= 0 or data.empty:
+        return data.iloc[:0].assign(hora=[], dia=[])
+    day = data['fecha'].dt.normalize()
+    totals = data.groupby(day)[column].sum().sort_values()
+    picked = totals.index[pd.unique(pd.Series(range(n)) * (len(totals) - 1) // max(n - 1, 1))]
+    days = data[day.isin(picked)]
+    return days.assign(hora=days['fecha'].dt.hour, dia=days['fecha'].dt.strftime('%Y-%m-%d'))
 
-    # filter the data to just get the date range selected
-    data = range_selector(data, min_date=session_state.min_date, max_date=session_state.max_date)
 
-    # filter the data to just get the days of the week selected
-    if session_state.days:
-        data = data[data['fecha'].dt.dayofweek.isin(session_state.days)]
+# ------------------- Power Profile Plot -------------------
+def plot_power_profile_daily_altair(data, cube, column, session_state=None, bands=('P10–P90', 'P25–P75'), n_sample_days=0):
+    '''Perfil diario como bandas de percentiles y mediana por hora, calculadas en el servidor (cube), en
+       lugar de una línea por día: el chart lleva 24 filas sin importar cuántos días tenga la ventana.
+       data (la serie filtrada del medidor) solo se usa para los n_sample_days días de muestra.'''
+    # hourly quantiles of the meter, from the aggregate cube of the filtered data (utils.cube)
+    profile = cube.frame(column)
 
-    if data.empty:
+    if profile.empty:
         print(f"No valid data for column '{column}'.")
         return None
-    # get a new column of just the date without time 
-    data['solo_fecha'] = data['fecha'].dt.date
 
-    daily_data = data[['fecha', column, 'solo_fecha']]
-    daily_data['fecha'] = data['fecha'].dt.strftime('%Y-%m-%dT%H:%M:%S')
-    # plot every day in light grey
-    line_chart = alt.Chart(daily_data).mark_line(color='grey', opacity=0.14).encode(
-        x=alt.X('hours(fecha):T', title='Hora'),
-        y=alt.Y(f'{column}:Q', title='Demanda [kW]'),
-        color=alt.Color('solo_fecha:T', legend=None),
-    )
-    print('dataa', daily_data)
-    # Calculate the median of the daily_data
-    median_chart = alt.Chart(daily_data).mark_line(color='#4C72B0').encode(
-        x=alt.X('hours(fecha):T', title=''),
+    layers = []
+    # widest band first so the narrower ones are drawn on top of it
+    for band in sorted(bands, key=lambda band: PROFILE_BANDS[band][0]):
+        low, high = (f'q{round(q * 100):02d}' for q in PROFILE_BANDS[band])
+        layers.append(alt.Chart(profile[['hora', low, high]].assign(banda=band)).mark_area(opacity=0.25, color='#4C72B0').encode(
+            x=alt.X('hora:Q', title='Hora', scale=alt.Scale(domain=[0, 23])),
+            y=alt.Y(f'{low}:Q', title='Demanda [kW]').scale(zero=False),
+            y2=f'{high}:Q',
+            tooltip=[alt.Tooltip('banda:N', title='Banda'), alt.Tooltip('hora:Q', title='Hora'),
+                     alt.Tooltip(f'{low}:Q', format=',.2f'), alt.Tooltip(f'{high}:Q', format=',.2f')],
+        ))
+
+    # a few real days on top of the bands, lowest to highest daily consumption
+    days = sample_days(data, column, n_sample_days)
+    if not days.empty:
+        layers.append(alt.Chart(days[['hora', column, 'dia']]).mark_line(strokeWidth=1.5, opacity=0.8).encode(
+            x=alt.X('hora:Q', title='Hora'),
+            y=alt.Y(f'{column}:Q', title='Demanda [kW]'),
+            color=alt.Color('dia:N', title='Día de muestra'),
+        ))
+
+    # median of every hour of the day
+    layers.append(alt.Chart(profile[['hora', 'q50']]).mark_line(color='#4C72B0').encode(
+        x=alt.X('hora:Q', title='Hora'),
         # y shows the median of all the daily data
-        y=alt.Y(f'{column}:Q', aggregate='median', title='').scale(zero=False),
-        strokeWidth=alt.value(5.0)
-    )
+        y=alt.Y('q50:Q', title='Demanda [kW]').scale(zero=False),
+        strokeWidth=alt.value(5.0),
+        tooltip=[alt.Tooltip('hora:Q', title='Hora'), alt.Tooltip('q50:Q', title='Mediana', format=',.2f')],
+    ))
 
-    # Create a layer with the line chart and the median line
-    chart = alt.layer(line_chart, median_chart).properties(
+    # Create a layer with the bands, the sample days and the median line
+    chart = alt.layer(*layers).properties(
         width=600,  # Set the width of the chart
         height=400,  # Set the height of the chart
         title=(f'Perfil de potencia diario {column}')  # Set the title of the chart
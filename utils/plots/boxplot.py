@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import altair as alt
+
+from utils.cube import grouped_stats
+
+# statistics of every box, in the order they're drawn
+BOX_COLUMNS = ['whisker_low', 'q25', 'q50', 'q75', 'whisker_high']
+
+
+def box_stats(values, groups, x, labels=None):
+    '''Cuartiles, bigotes y puntos atípicos por grupo calculados con NumPy, lo que mark_boxplot calculaba
+       en el navegador con todas las filas.
+       ---------------------------------------------------------------------------------
+       Parameters
+       values: array
+       groups: array de enteros
+                  Grupo de cada valor (hora, día de la semana, ...), desde 0.
+       x: str
+                  Nombre de la columna del grupo en los DF de salida.
+       labels: list
+                  Etiqueta de cada grupo; por defecto el número de grupo.
+       ---------------------------------------------------------------------------------
+       Return
+       stats: DataFrame
+                  Una fila por grupo con lecturas: x, count y BOX_COLUMNS.
+       outliers: DataFrame
+                  x y value de los puntos fuera de los bigotes.'''
+    groups = np.asarray(groups, dtype=np.int64)
+    size = len(labels) if labels is not None else int(groups.max()) + 1 if len(groups) else 0
+    labels = np.asarray(labels if labels is not None else np.arange(size), dtype=object)
+    stats = grouped_stats(values, groups, size, q=(0.25, 0.5, 0.75))
+
+    frame = pd.DataFrame({
+        x: labels,
+        'count': stats['count'],
+        'whisker_low': stats['whisker_low'],
+        'q25': stats['quantiles'][stats['q'].index(0.25)],
+        'q50': stats['quantiles'][stats['q'].index(0.5)],
+        'q75': stats['quantiles'][stats['q'].index(0.75)],
+        'whisker_high': stats['whisker_high'],
+    })
+    outliers = pd.DataFrame({x: labels[stats['outlier_groups']], 'value': stats['outlier_values']})
+    return frame[frame['count'] > 0].reset_index(drop=True), outliers
+
+
+# ----------- boxplot from precomputed statistics -----------
+def box_layers(stats, x, x_title, y_title, outliers=None, size=23, x_sort='ascending', y_format=None):
+    '''Boxplot dibujado con capas (bigotes, caja, mediana y puntos atípicos) a partir de un DF de
+       estadísticos con las columnas de BOX_COLUMNS, una fila por caja. Reemplaza mark_boxplot, que
+       necesita todos los puntos en el navegador.'''
+    axis = alt.Axis(format=y_format) if y_format else alt.Axis()
+    base = alt.Chart(stats).encode(
+        x=alt.X(f'{x}:O', title=x_title, sort=x_sort),
+    )
+
+    whiskers = base.mark_rule(color='black').encode(
+        y=alt.Y('whisker_low:Q', title=y_title, axis=axis).scale(zero=False),
+        y2='whisker_high:Q',
+    )
+    box = base.mark_bar(size=size, stroke='black').encode(
+        y='q25:Q',
+        y2='q75:Q',
+        color=alt.value('#2d667a'),  # Set the color of the bars
+        opacity=alt.value(0.9),  # Set the opacity of the bars
+        tooltip=[
+            alt.Tooltip(f'{x}:O', title=x_title),
+            alt.Tooltip('q50:Q', title='Mediana', format=',.2f'),
+            alt.Tooltip('q25:Q', title='Q1', format=',.2f'),
+            alt.Tooltip('q75:Q', title='Q3', format=',.2f'),
+            alt.Tooltip('count:Q', title='Lecturas'),
+        ],
+    )
+    median = base.mark_tick(color='red', size=size).encode(
+        y='q50:Q',
+    )
+    layers = [whiskers, box, median]
+
+    if outliers is not None and not outliers.empty:
+        # only the points outside the whiskers travel to the browser
+        layers.append(alt.Chart(outliers).mark_point(color='#2d667a', size=12, opacity=0.6).encode(
+            x=alt.X(f'{x}:O', sort=x_sort),
+            y='value:Q',
+        ))
+
+    return alt.layer(*layers)
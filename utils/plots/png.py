@@ -0,0 +1,89 @@
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import streamlit as st
+
+from utils.derived import DERIVED_CACHE, MISSING
+
+
+@st.cache_resource
+def figure_pool():
+    # one pool for the whole server; spawn, a fork of the threaded Streamlit process isn't safe
+    return ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+
+
+def figure_png(figure, *args):
+    # runs in a worker: figure(*args) is a matplotlib Figure built without pyplot, saved with Agg
+    fig = figure(*args)
+    buffer = io.BytesIO()
+    # bbox_inches='tight' like st.pyplot, so rotated labels aren't cut
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def submit_figure(figure, *args):
+    # a pool broken by a dead worker stays broken; drop it from cache_resource and start a new one
+    try:
+        return figure_pool().submit(figure_png, figure, *args)
+    except BrokenProcessPool:
+        figure_pool.clear()
+        return figure_pool().submit(figure_png, figure, *args)
+
+
+def render_pngs(store, chart, meters, prepare, figure, params=()):
+    '''PNG de un gráfico matplotlib para varios medidores, dibujados en paralelo en figure_pool.
+       ---------------------------------------------------------------------------------
+       Parameters
+       store: MeterStore
+                  El store o la vista filtrada de donde salen los datos; los PNG quedan en DERIVED_CACHE
+                  bajo su fingerprint, así que la clave ya incluye el dataset y el filtro del sidebar.
+       chart: str
+                  Nombre del gráfico, parte de la clave.
+       prepare: function
+                  prepare(medidor) -> datos chicos para figure (la agregación se hace aquí, en el
+                  proceso de Streamlit), o None si el medidor no tiene datos.
+       figure: function
+                  figure(datos, medidor) -> Figure, definida a nivel de módulo para poder mandarla al
+                  worker.
+       params: tuple
+                  Otros parámetros que cambian el gráfico (p. ej. zero_values), parte de la clave.
+       ---------------------------------------------------------------------------------
+       Return
+       images: dict
+                  medidor -> bytes del PNG, o None si no tiene datos.
+       errors: dict
+                  medidor -> excepción de los que no se pudieron dibujar (no se guardan en el caché).'''
+    keys = {meter: (store.fingerprint, 'png', chart, meter) + tuple(params) for meter in meters}
+    images = {meter: DERIVED_CACHE.get(key, default=MISSING) for meter, key in keys.items()}
+    futures, errors = {}, {}
+    for meter, image in images.items():
+        if image is not MISSING:
+            continue
+        try:
+            data = prepare(meter)
+            if data is None:
+                images[meter] = DERIVED_CACHE.put(keys[meter], None)
+            else:
+                futures[meter] = (submit_figure(figure, data, meter), data)
+        except Exception as e:
+            print(f"PNG '{chart}' del medidor {meter}: {e!r}")
+            images[meter] = None
+            errors[meter] = e
+    # every figure is submitted before waiting for the first one
+    for meter, (future, data) in futures.items():
+        try:
+            try:
+                image = future.result()
+            except BrokenProcessPool:
+                # a worker died and took the pool with it: the next render gets a new pool, this one
+                # draws what's left in the Streamlit process
+                figure_pool.clear()
+                image = figure_png(figure, data, meter)
+            images[meter] = DERIVED_CACHE.put(keys[meter], image)
+        except Exception as e:
+            print(f"PNG '{chart}' del medidor {meter}: {e!r}")
+            images[meter] = None
+            errors[meter] = e
+    return images, errors
@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+
+import altair as alt
+import streamlit as st
+
+from utils.chart_cache import ChartCache, chart_key
+
+# encoding properties Vega evaluates in the browser over the embedded rows
+CLIENT_TRANSFORMS = ('aggregate', 'bin', 'timeUnit')
+# altair's data transformer and theme are process globals
+_altair_lock = threading.Lock()
+
+# what each chart embeds, on stderr at INFO; CHART_LOG_LEVEL=WARNING turns it off. The app sets no
+# logging config and streamlit only configures its own loggers, so this one gets its own handler
+logger = logging.getLogger('charts')
+logger.setLevel(os.getenv("CHART_LOG_LEVEL", "INFO").upper())
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logger.addHandler(handler)
+    logger.propagate = False
+
+
+def chart_parts(chart, data=alt.Undefined):
+    # (chart, data it draws) for the chart and every chart layered or concatenated inside it; a part
+    # without its own data uses its parent's
+    if chart.data is not alt.Undefined:
+        data = chart.data
+    yield chart, data
+    for attribute in ('layer', 'hconcat', 'vconcat', 'concat'):
+        for part in getattr(chart, attribute, None) or []:
+            yield from chart_parts(part, data)
+
+
+def embedded_rows(chart):
+    # rows of every DataFrame the chart carries; each one ends up in the spec sent to the browser
+    return sum(len(part.data) for part, _ in chart_parts(chart) if hasattr(part.data, 'shape'))
+
+
+def client_transforms(chart):
+    '''Transformaciones que quedarían para el navegador: transform_* y aggregate/bin/timeUnit en los
+       encodings. Los charts de utils/plots reciben los datos ya agregados en el servidor (cube,
+       box_stats, histograms, downsample), así que esta lista debería estar vacía; .interactive() es un
+       parámetro de selección, no una transformación, y no cuenta.'''
+    found = []
+    for part, data in chart_parts(chart):
+        if part.transform is not alt.Undefined and part.transform:
+            found.extend(type(transform).__name__ for transform in part.transform)
+        encoding = getattr(part, 'encoding', alt.Undefined)
+        if encoding is alt.Undefined:
+            continue
+        # the data lets altair infer the types of shorthand fields without one
+        for channel, definition in encoding.to_dict(validate=False, context={'data': data}).items():
+            for definition in definition if isinstance(definition, list) else [definition]:
+                if isinstance(definition, dict):
+                    found.extend(f'{channel}.{key}' for key in CLIENT_TRANSFORMS if key in definition)
+                elif isinstance(definition, str) and '(' in definition:
+                    found.append(f'{channel}.{definition}')  # shorthand like 'median(x):Q'
+    return found
+
+
+def log_chart(chart, name):
+    # what the chart embeds and any transformation still left for the browser
+    if chart is None:
+        raise ValueError(f"No valid data for chart '{name}'.")
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    transforms = client_transforms(chart)
+    logger.info("chart '%s': %d filas embebidas%s", name, embedded_rows(chart),
+                f", transformaciones en el navegador: {', '.join(transforms)}" if transforms else '')
+
+
+def chart_spec(chart):
+    '''Spec de Vega-Lite del chart como lo arma st.altair_chart: cada DataFrame queda tal cual en
+       datasets (st.vega_lite_chart lo pasa a Arrow), sin el límite de 5000 filas y sin el ancho y
+       alto del tema default de altair.'''
+    frames = {}
+
+    def named(data):
+        for name, frame in frames.items():
+            if frame is data:
+                return {'name': name}
+        name = f'data-{len(frames)}'
+        frames[name] = data
+        return {'name': name}
+
+    with _altair_lock:
+        alt.data_transformers.register('named_frames', named)
+        with alt.data_transformers.enable('named_frames'), alt.themes.enable('none'):
+            spec = chart.to_dict()
+    spec['datasets'] = {**spec.get('datasets', {}), **frames}
+    return spec
+
+
+@st.cache_resource
+def get_chart_cache():
+    # specs shared by every session, bounded by CHART_CACHE_MB like DERIVED_CACHE_MB
+    return ChartCache(int(float(os.getenv("CHART_CACHE_MB", 256)) * 2**20))
+
+
+def show_cached_chart(key, build, name, use_container_width=True):
+    '''Todos los charts de Altair de las páginas pasan por aquí: build() solo se llama si key
+       (chart_key) no está en el caché de specs, y entonces se registra lo que embebe; un chart sin
+       cambios en el rerun se dibuja desde el spec guardado.'''
+    cache = get_chart_cache()
+    spec = cache.get(key)
+    if spec is None:
+        chart = build()
+        log_chart(chart, name)
+        spec = cache.put(key, chart_spec(chart))
+    # streamlit takes datasets out of the dict it receives, the cached one stays intact
+    st.vega_lite_chart(spec=dict(spec), use_container_width=use_container_width)
@@ -0,0 +1,25 @@
+import altair as alt
+import numpy as np
+
+
+# ----------- temporal fields for the charts -----------
+# The timestamps of the app are naive wall-clock times. They travel as epoch milliseconds and every chart
+# reads them in UTC, so the browser shows the same wall-clock time whatever its own timezone is. That is
+# what the ISO strings without offset did, without formatting a string per row.
+
+def epoch_ms(data, columns=('fecha',)):
+    # copy of data with the datetime columns as int64 milliseconds since epoch, a vectorized cast
+    data = data.copy(deep=False)
+    for column in columns:
+        data[column] = data[column].to_numpy(dtype='datetime64[ns]').astype('datetime64[ms]').astype(np.int64)
+    return data
+
+
+def time_x(field='fecha', title='Fecha', format=None, **kwargs):
+    # x encoding of an epoch ms field read in UTC
+    axis = alt.Axis(format=format, formatType='utc') if format else alt.Axis()
+    return alt.X(f'{field}:T', title=title, axis=axis, scale=alt.Scale(type='utc'), **kwargs)
+
+
+def time_tooltip(field='fecha', title='Fecha', format='%d/%m/%Y %H:%M'):
+    return alt.Tooltip(f'{field}:T', title=title, format=format, formatType='utc')
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+
+class DatasetRegistry:
+    '''Registro de datasets compartido por todas las sesiones del proceso, con presupuesto de memoria.
+
+    Las claves son (organización, inmueble, variable, ventana) y los valores objetos con nbytes y
+    freeze() (MeterStore). Al guardar un dataset se congela, así las sesiones comparten la misma
+    instancia sin copiarla. Si el total supera budget_bytes se descartan los menos usados (LRU); las
+    sesiones que ya tienen la referencia la siguen usando.'''
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._datasets = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._datasets.move_to_end(key)
+            return dataset
+
+    def put(self, key, dataset):
+        dataset.freeze()
+        with self._lock:
+            previous = self._datasets.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+            self._datasets[key] = dataset
+            self._nbytes += dataset.nbytes
+            # evict least recently used, never the dataset just stored
+            while self._nbytes > self.budget_bytes and len(self._datasets) > 1:
+                _, evicted = self._datasets.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+                self._evictions += 1
+        return dataset
+
+    def get_or_load(self, keys, loader):
+        '''Datasets de keys; loader(faltantes) -> {clave: dataset} solo se llama con las que no están.
+           Si dos sesiones piden las mismas claves a la vez, la segunda espera la carga de la primera.'''
+        keys = tuple(keys)
+        with self._lock:
+            loading = self._loading.setdefault(keys, threading.Lock())
+        with loading:
+            datasets = {key: self.get(key) for key in keys}
+            missing = [key for key, dataset in datasets.items() if dataset is None]
+            if missing:
+                for key, dataset in loader(missing).items():
+                    datasets[key] = self.put(key, dataset)
+        with self._lock:
+            self._loading.pop(keys, None)
+        return datasets
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'datasets': len(self._datasets),
+                'nbytes': self._nbytes,
+                'budget_bytes': self.budget_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+            }
@@ -1,3 +1,5 @@
+import math
+
 import streamlit as st
 
 # Define a function to get or create SessionState
@@ -60,4 +62,24 @@ def sidebar(session_state):
     session_state.max_date = max_date
     session_state.zero_values = zero_values
     session_state.days = days
-    return min_date, max_date, zero_values,days
\ No newline at end of file
+    return min_date, max_date, zero_values,days
+
+# Sidebar pager for the pages that draw one chart per meter
+def meters_pager(session_state, page_name, per_page=6):
+    '''Medidores del inmueble (en el orden de session_state.systems) que se dibujan en esta corrida.
+       Solo los de la página actual se calculan; cambiar un filtro del sidebar vuelve a dibujar
+       solo esos. Devuelve un set con los nombres sin puntos, como los usan las páginas.'''
+    meters = []
+    for key, value in session_state.systems.items():
+        location = session_state.meters_location[session_state.meters_location['location_id'] == value]
+        meters.extend(location['meter_name'].str.replace('.', ''))
+
+    with st.sidebar.expander("Medidores por página", expanded=len(meters) > per_page):
+        per_page = int(st.number_input("Medidores por página", min_value=1, max_value=max(len(meters), 1),
+                                       value=min(per_page, max(len(meters), 1)), key=f'{page_name}_per_page'))
+        pages = max(1, math.ceil(len(meters) / per_page))
+        page = int(st.number_input(f"Página (de {pages})", min_value=1, max_value=pages, value=1,
+                                   key=f'{page_name}_page'))
+    start = (page - 1) * per_page
+    st.sidebar.caption(f"Medidores {min(start + 1, len(meters))}–{min(start + per_page, len(meters))} de {len(meters)}")
+    return set(meters[start:start + per_page])
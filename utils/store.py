@@ -0,0 +1,150 @@
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+def window_bounds(fecha, min_date=None, max_date=None):
+    '''Posiciones [inicio, fin) de la ventana min_date <= fecha < max_date + 1 día sobre fechas ordenadas.
+       Búsqueda binaria, O(log n); None deja el extremo abierto. Incluye todas las horas de max_date y
+       ninguna del día siguiente.'''
+    fecha = np.asarray(fecha, dtype='datetime64[ns]')
+    start = 0 if min_date is None else np.searchsorted(fecha, pd.to_datetime(min_date).to_datetime64(), side='left')
+    end = len(fecha) if max_date is None else np.searchsorted(
+        fecha, (pd.to_datetime(max_date) + pd.Timedelta(days=1)).to_datetime64(), side='left')
+    return int(start), int(max(start, end))
+
+
+class HourlySeries(namedtuple('HourlySeries', ['fecha', 'values'])):
+    '''Serie de un medidor: fecha (DatetimeIndex ordenado) y values del mismo largo. Sigue siendo una
+    tupla, así que fecha, values = serie funciona igual que antes.'''
+    __slots__ = ()
+
+    @classmethod
+    def from_frame(cls, data, column):
+        # from a narrow DF with fecha, sorting only when the frame isn't already in time order
+        fecha = pd.DatetimeIndex(data['fecha'])
+        values = data[column].to_numpy()
+        if not fecha.is_monotonic_increasing:
+            order = np.argsort(fecha.to_numpy(), kind='stable')
+            fecha, values = fecha[order], values[order]
+        return cls(fecha, values)
+
+    def frame(self, name):
+        return pd.DataFrame({'fecha': self.fecha, name: self.values}, copy=False)
+
+
+class MeterStore:
+    '''Series horarias de varios medidores en una representación compacta y dispersa.
+
+    index es el eje de tiempo común (datetime64, ordenado y sin repetidos). Cada medidor guarda solo
+    las horas en las que tiene lectura: posiciones int32 sobre index y valores float32, concatenados
+    para todos los medidores; las lecturas del medidor i están entre offsets[i] y offsets[i + 1].
+    Las columnas se piden por nombre de medidor, como en el DF ancho que reemplaza.'''
+
+    def __init__(self, index, meter_ids, offsets, positions, values, names):
+        self.index = index
+        self.meter_ids = meter_ids
+        self.offsets = offsets
+        self.positions = positions
+        self.values = values
+        self.names = names  # meter name -> position in meter_ids
+
+    @classmethod
+    def from_long(cls, long_df, meters):
+        '''Construye el store desde el formato largo (fecha, meter_id, value) sin pasar por el DF ancho.
+           meters trae meter_id y meter_name; lecturas repetidas de la misma hora se suman como en el
+           pivot SUM(CASE ...).'''
+        meter_ids = pd.Index(meters['meter_id'].drop_duplicates())
+        index, date_codes = np.unique(long_df['fecha'].to_numpy(dtype='datetime64[ns]'), return_inverse=True)
+        meter_codes = meter_ids.get_indexer(long_df['meter_id'])
+
+        values = long_df['value'].to_numpy(dtype='float64')
+        valid = ~np.isnan(values) & (meter_codes >= 0)
+
+        # one cell per (meter, hour), sorted by meter then hour
+        hours = max(len(index), 1)
+        cells, cell_codes = np.unique(meter_codes[valid].astype(np.int64) * hours + date_codes[valid],
+                                      return_inverse=True)
+        sums = np.bincount(cell_codes, weights=values[valid], minlength=len(cells))
+
+        offsets = np.zeros(len(meter_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells // hours, minlength=len(meter_ids)), out=offsets[1:])
+
+        names = dict(zip(meters['meter_name'], meter_ids.get_indexer(meters['meter_id'])))
+        return cls(index, meter_ids.to_numpy(), offsets, (cells % hours).astype(np.int32),
+                   sums.astype(np.float32), names)
+
+    def freeze(self):
+        # read-only arrays, a store shared between sessions can't be modified through any of them
+        for array in (self.index, self.meter_ids, self.offsets, self.positions, self.values):
+            array.flags.writeable = False
+        return self
+
+    @property
+    def columns(self):
+        return list(self.names)
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + self.offsets.nbytes + self.positions.nbytes + self.values.nbytes
+
+    @property
+    def fingerprint(self):
+        # content hash of the store, computed once per instance; stores are frozen once shared, so it
+        # identifies the dataset in caches that outlive a session (utils.chart_cache)
+        if '_fingerprint' not in self.__dict__:
+            digest = hashlib.blake2b(digest_size=16)
+            for array in (self.index, self.meter_ids.astype(str), self.offsets, self.positions, self.values):
+                digest.update(np.ascontiguousarray(array).tobytes())
+            digest.update(repr(sorted(self.names.items())).encode())
+            self.__dict__['_fingerprint'] = digest.hexdigest()
+        return self.__dict__['_fingerprint']
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def window_positions(self, min_date=None, max_date=None):
+        # [start, end) over index for a date window, see window_bounds
+        return window_bounds(self.index, min_date, max_date)
+
+    def series(self, name, min_date=None, max_date=None):
+        '''HourlySeries de un medidor, opcionalmente solo la ventana [min_date, max_date + 1 día).
+           Las horas de cada medidor están ordenadas, la ventana se ubica con searchsorted sobre sus
+           posiciones y los valores son una vista del store, no una copia.'''
+        meter = self.names[name]
+        start, end = self.offsets[meter], self.offsets[meter + 1]
+        if min_date is not None or max_date is not None:
+            first, last = self.window_positions(min_date, max_date)
+            positions = self.positions[start:end]
+            start, end = (start + np.searchsorted(positions, first, side='left'),
+                          start + np.searchsorted(positions, last, side='left'))
+        return HourlySeries(pd.DatetimeIndex(self.index[self.positions[start:end]]), self.values[start:end])
+
+    def frame(self, names):
+        '''DF angosto con fecha y las columnas pedidas (float32). Con un solo medidor solo trae sus horas
+           con lectura; con varios, la unión de sus horas y NaN donde alguno no tiene lectura.'''
+        if isinstance(names, str):
+            names = [names]
+        if len(names) == 1:
+            # the column wraps the store's values without copying them
+            return self.series(names[0]).frame(names[0])
+
+        spans = [(self.offsets[self.names[name]], self.offsets[self.names[name] + 1]) for name in names]
+        rows = np.unique(np.concatenate([self.positions[start:end] for start, end in spans] + [np.empty(0, np.int32)]))
+        frame = {'fecha': self.index[rows]}
+        for name, (start, end) in zip(names, spans):
+            column = np.full(len(rows), np.nan, dtype=np.float32)
+            column[np.searchsorted(rows, self.positions[start:end])] = self.values[start:end]
+            frame[name] = column
+        return pd.DataFrame(frame)
+
+    def summary(self):
+        # one row per meter, what inicio shows instead of the whole wide frame
+        rows = []
+        for name in self.names:
+            fecha, values = self.series(name)
+            rows.append({'medidor': name, 'lecturas': len(values),
+                         'desde': fecha[0] if len(fecha) else pd.NaT, 'hasta': fecha[-1] if len(fecha) else pd.NaT})
+        return pd.DataFrame(rows, columns=['medidor', 'lecturas', 'desde', 'hasta'])